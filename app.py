@@ -1,12 +1,17 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import datetime
-import json
-import os
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+import importlib.util
+import queue
+import threading
+import time
+# Отсчет времени до первого окна - до импорта модулей приложения
+STARTED = time.perf_counter()
+from instrumentation import configure as configure_instrumentation, record, span
+from storage import DATE_FORMAT, MARKS, AttendanceStore, ConfigWatcher, parse_date, server_address
+
+# Как часто проверяется, не изменился ли config.json
+CONFIG_POLL_MS = 2000
 
 class AttendanceApp:
     def __init__(self, root):
@@ -15,33 +20,99 @@ class AttendanceApp:
         self.root.geometry("400x150")
         self.root.configure(padx=20, pady=20)
 
-        # Регистрация шрифта
-        pdfmetrics.registerFont(TTFont('OpenSans', 'OpenSans-VariableFont_wdth,wght.ttf'))
-        self.font_name = 'OpenSans'
+        # Конфигурация читается первой: в ней может включаться сбор замеров
+        with span("startup.load_config"):
+            self.load_config()
 
-        self.load_config()
-        self.attendance_data = self.load_attendance_data()
+        with span("startup.load_attendance_data"):
+            self.attendance_data = self.load_attendance_data()
+
+        # reportlab, pypdf, openpyxl и шрифт нужны только для отчетов и загружаются
+        # в фоне после показа окна (или при первом отчете, если фон не успел)
+        self.report = None
+        self.report_lock = threading.Lock()
         self.create_main_form()
+        self.root.after_idle(self.window_ready)
+
+    def window_ready(self):
+        record("startup.first_window", time.perf_counter() - STARTED)
+        threading.Thread(target=self.warm_up, name="report-warmup", daemon=True).start()
+        self.config_updates = queue.Queue()
+        threading.Thread(target=self.watch_config, name="config-watcher", daemon=True).start()
+        self.root.after(CONFIG_POLL_MS, self.poll_config)
+
+    def warm_up(self):
+        self.report_generator()
+        with span("startup.import_export"):
+            import export  # noqa: F401 - openpyxl для выгрузки в XLSX
+
+    def report_generator(self):
+        with self.report_lock:
+            if self.report is None:
+                with span("startup.load_report"):
+                    from report import REPORT_CACHE_DIR, ReportGenerator, register_font
+                    self.font_name = register_font()
+                    self.report = ReportGenerator(self.config_index, self.attendance_data, self.font_name,
+                                                  REPORT_CACHE_DIR if self.report_cache else None)
+                    # Индекс мог смениться во время создания: apply_config этот отчет еще не видел
+                    self.report.config = self.config_index
+            return self.report
 
     def load_config(self):
-        if os.path.exists("config.json"):
-            with open("config.json", "r", encoding="utf-8") as f:
-                config = json.load(f)
-                self.students = config["students"]
-                self.subjects = config["subjects"]
-        else:
-            raise Exception("Файл config.json не найден!")
+        self.config_watcher = ConfigWatcher()
+        config, index = self.config_watcher.load()
+        self.apply_config(config, index)
+        configure_instrumentation(config.get("instrumentation"))
+        self.server = server_address(config)
+        # Кэш таблиц ускоряет повторные отчеты, но увеличивает PDF - только по "report_cache": true
+        self.report_cache = bool(config.get("report_cache"))
+
+    def apply_config(self, config, index):
+        # Индекс заменяется одной ссылкой, без блокировок: окна и отчет видят либо старую,
+        # либо новую версию, а Tk не ждет фоновой загрузки reportlab
+        self.students = config["students"]
+        self.subjects = index.subjects
+        self.config_index = index
+        report = getattr(self, "report", None)
+        if report is not None:
+            report.config = index
+
+    def watch_config(self):
+        # Разбор большого config.json и сборка индекса идут в фоне, чтобы не подвешивать окно
+        while True:
+            time.sleep(CONFIG_POLL_MS / 1000)
+            changed = self.config_watcher.poll()
+            if changed:
+                self.config_updates.put(changed)
+
+    def poll_config(self):
+        # Изменения config.json подхватываются без перезапуска; адрес сервиса и замеры - только при запуске
+        try:
+            while True:
+                self.apply_config(*self.config_updates.get_nowait())
+        except queue.Empty:
+            pass
+        self.root.after(CONFIG_POLL_MS, self.poll_config)
 
     def load_attendance_data(self):
-        if os.path.exists("attendance_data.json"):
-            with open("attendance_data.json", "r", encoding="utf-8") as f:
-                return json.load(f)
-        else:
-            return {subject: {} for subject in self.subjects}
+        # С общим сервисом данные хранит он, приложение только отправляет занятия
+        if self.server:
+            # service.py (asyncio, socket) нужен только с настроенным сервисом
+            from service import RemoteStore
+            try:
+                return RemoteStore(*self.server)
+            except OSError as e:
+                # Без сервиса не работаем с локальными данными: отметки разошлись бы с общими
+                host, port = self.server
+                messagebox.showerror("Ошибка", f"Сервис явки {host}:{port} недоступен: {e}")
+                raise SystemExit(1)
+        # Читается только манифест, шарды подгружаются при обращении к предмету
+        store = AttendanceStore()
+        store.migrate_legacy()
+        return store
 
     def save_attendance_data(self):
-        with open("attendance_data.json", "w", encoding="utf-8") as f:
-            json.dump(self.attendance_data, f, ensure_ascii=False, indent=4)
+        self.attendance_data.flush()
 
     def create_main_form(self):
         # Заголовок
@@ -75,7 +146,7 @@ class AttendanceApp:
         ttk.Label(input_frame, text="Дата (ДД.ММ.ГГГГ):").grid(row=1, column=0, sticky="w", pady=5)
         date_entry = ttk.Entry(input_frame, width=40)
         date_entry.grid(row=1, column=1, pady=5, sticky="ew")
-        date_entry.insert(0, datetime.datetime.now().strftime("%d.%m.%Y"))
+        date_entry.insert(0, datetime.datetime.now().strftime(DATE_FORMAT))
 
         ttk.Label(input_frame, text="Тип занятия:").grid(row=2, column=0, sticky="w", pady=5)
         type_combo = ttk.Combobox(input_frame, state="readonly", width=40)
@@ -87,15 +158,17 @@ class AttendanceApp:
         students_frame = ttk.LabelFrame(mark_window, text="Студенты", padding=10)
         students_frame.pack(fill="both", expand=True, pady=10)
 
-        canvas = tk.Canvas(students_frame)
-        scrollbar = ttk.Scrollbar(students_frame, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-
-        scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        canvas.pack(side="left", fill="both", expand=True)
+        # Treeview отрисовывает только видимые строки, поэтому переключение
+        # предмета или типа занятия не зависит от размера группы
+        tree = ttk.Treeview(students_frame, columns=("student", "mark"), show="headings", selectmode="extended")
+        tree.heading("student", text="ФИО студента")
+        tree.heading("mark", text="Отметка")
+        tree.column("student", width=380)
+        tree.column("mark", width=100, anchor="center")
+        scrollbar = ttk.Scrollbar(students_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+
+        tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
 
         student_marks = {}
@@ -105,19 +178,13 @@ class AttendanceApp:
             subject = subject_combo.get()
             if not subject:
                 return
-            types = []
-            if self.subjects[subject]["lectures"]:
-                types.append("Лекция")
-            if self.subjects[subject]["practices"]:
-                types.append("Практика")
-            if self.subjects[subject]["labs"]:
-                types.extend([f"Лабораторная работа - {sg}" for sg in self.subjects[subject]["labs"].keys()])
+            types = self.config_index.class_types(subject)
             type_combo["values"] = types
             type_combo.set(types[0] if types else "")
+            update_students(event)
 
         def update_students(event):
-            for widget in scrollable_frame.winfo_children():
-                widget.destroy()
+            tree.delete(*tree.get_children())
             student_marks.clear()
 
             subject = subject_combo.get()
@@ -125,20 +192,41 @@ class AttendanceApp:
             if not subject or not class_type:
                 return
 
-            if "Лабораторная работа" in class_type:
-                subgroup = class_type.split(" - ")[1]
-                students = self.subjects[subject]["labs"].get(subgroup, [])
+            for student in self.config_index.roster(subject, class_type):
+                student_marks[student] = tree.insert("", "end", values=(student, MARKS[0]))
+
+        def set_marks(items, mark=None):
+            # Без явной отметки значение перебирается по кругу: есть -> н -> б
+            for item in items:
+                value = mark
+                if value is None:
+                    current = tree.set(item, "mark")
+                    value = MARKS[(MARKS.index(current) + 1) % len(MARKS)]
+                tree.set(item, "mark", value)
+
+        def on_key(event):
+            items = tree.selection() or ([tree.focus()] if tree.focus() else [])
+            if event.keysym == "space":
+                set_marks(items)
+            elif event.char in ("1", "2", "3"):
+                set_marks(items, MARKS[int(event.char) - 1])
             else:
-                students = self.subjects[subject]["students"]
+                return
+            return "break"
+
+        def on_double_click(event):
+            item = tree.identify_row(event.y)
+            if item:
+                set_marks([item])
+
+        tree.bind("<Key>", on_key)
+        tree.bind("<Double-1>", on_double_click)
 
-            for student in students:
-                frame = ttk.Frame(scrollable_frame)
-                frame.pack(fill="x", pady=5)
-                ttk.Label(frame, text=student, width=45).pack(side="left", padx=5)
-                mark_combo = ttk.Combobox(frame, values=["есть", "н", "б"], state="readonly", width=10)
-                mark_combo.set("есть")
-                mark_combo.pack(side="left")
-                student_marks[student] = mark_combo
+        bulk_frame = ttk.Frame(students_frame)
+        bulk_frame.pack(side="bottom", fill="x", before=tree, pady=(0, 5))
+        ttk.Label(bulk_frame, text="Пробел / двойной щелчок - сменить отметку, 1/2/3 - есть/н/б").pack(side="left")
+        ttk.Button(bulk_frame, text="Все присутствуют",
+                   command=lambda: set_marks(tree.get_children(), MARKS[0])).pack(side="right")
 
         subject_combo.bind("<<ComboboxSelected>>", update_types)
         type_combo.bind("<<ComboboxSelected>>", update_students)
@@ -157,28 +245,25 @@ class AttendanceApp:
                 return
 
             try:
-                datetime.datetime.strptime(date, "%d.%m.%Y")
+                parse_date(date)
             except ValueError:
                 messagebox.showerror("Ошибка", "Неверный формат даты! Используйте ДД.ММ.ГГГГ", parent=mark_window)
                 return
 
-            if date not in self.attendance_data[subject]:
-                self.attendance_data[subject][date] = {}
-            if class_type not in self.attendance_data[subject][date]:
-                self.attendance_data[subject][date][class_type] = {}
-
-            for student, mark_combo in student_marks.items():
-                self.attendance_data[subject][date][class_type][student] = mark_combo.get()
-
-            self.attendance_data[subject][date][class_type]["confirmed"] = confirmed_var.get()
-            self.save_attendance_data()
+            marks = {student: tree.set(item, "mark") for student, item in student_marks.items()}
+            try:
+                self.attendance_data.record_session(subject, date, class_type, marks, confirmed_var.get())
+            except Exception as e:
+                # С общим сервисом сохранение может не дойти; окно остается открытым для повтора
+                messagebox.showerror("Ошибка", f"Не удалось сохранить явку: {e}", parent=mark_window)
+                return
             messagebox.showinfo("Успех", "Явка проставлена и сохранена!", parent=mark_window)
             mark_window.destroy()
 
     def open_report_window(self):
         report_window = tk.Toplevel(self.root)
         report_window.title("Сгенерировать отчет")
-        report_window.geometry("500x310")  # Увеличил размер окна
+        report_window.geometry("500x350")  # Увеличил размер окна
         report_window.configure(padx=20, pady=20)
 
         # Заголовок
@@ -195,17 +280,25 @@ class AttendanceApp:
         ttk.Label(input_frame, text="Дата начала (ДД.ММ.ГГГГ):").grid(row=1, column=0, sticky="w", pady=5)
         start_date_entry = ttk.Entry(input_frame, width=40)
         start_date_entry.grid(row=1, column=1, pady=5, sticky="ew")
-        start_date_entry.insert(0, (datetime.datetime.now() - datetime.timedelta(days=7)).strftime("%d.%m.%Y"))
+        start_date_entry.insert(0, (datetime.datetime.now() - datetime.timedelta(days=7)).strftime(DATE_FORMAT))
 
         ttk.Label(input_frame, text="Дата окончания (ДД.ММ.ГГГГ):").grid(row=2, column=0, sticky="w", pady=5)
         end_date_entry = ttk.Entry(input_frame, width=40)
         end_date_entry.grid(row=2, column=1, pady=5, sticky="ew")
-        end_date_entry.insert(0, datetime.datetime.now().strftime("%d.%m.%Y"))
+        end_date_entry.insert(0, datetime.datetime.now().strftime(DATE_FORMAT))
+
+        ttk.Label(input_frame, text="Формат:").grid(row=3, column=0, sticky="w", pady=5)
+        # Наличие openpyxl проверяется без импорта export: он тянет reportlab и подвесил бы окно до прогрева
+        formats = ["PDF", "CSV"] + (["XLSX"] if importlib.util.find_spec("openpyxl") else [])
+        format_combo = ttk.Combobox(input_frame, values=formats,
+                                    state="readonly", width=40)
+        format_combo.grid(row=3, column=1, pady=5, sticky="ew")
+        format_combo.current(0)
 
         input_frame.columnconfigure(1, weight=1)
 
         # Кнопка
-        ttk.Button(report_window, text="Сгенерировать PDF", command=lambda: generate(), width=20).pack(pady=20)
+        ttk.Button(report_window, text="Сгенерировать", command=lambda: generate(), width=20).pack(pady=20)
 
         def generate():
             subject = subject_combo.get()
@@ -217,8 +310,8 @@ class AttendanceApp:
                 return
 
             try:
-                start = datetime.datetime.strptime(start_date, "%d.%m.%Y")
-                end = datetime.datetime.strptime(end_date, "%d.%m.%Y")
+                start = parse_date(start_date)
+                end = parse_date(end_date)
                 if start > end:
                     messagebox.showerror("Ошибка", "Дата начала не может быть позже даты окончания!", parent=report_window)
                     return
@@ -226,205 +319,94 @@ class AttendanceApp:
                 messagebox.showerror("Ошибка", "Неверный формат даты! Используйте ДД.ММ.ГГГГ", parent=report_window)
                 return
 
-            self.generate_pdf(subject, start, end)
+            self.start_report_job(subject, start, end, format_combo.get().lower())
             report_window.destroy()
 
-    # Оставшиеся методы (wrap_text, draw_table, generate_pdf) без изменений
-    def wrap_text(self, c, text, max_width, font_name, font_size, wrap=True):
-        c.setFont(font_name, font_size)
-        if not wrap:
-            return [text]
-        lines = []
-        words = text.split()
-        current_line = ""
-        for word in words:
-            test_line = current_line + (word if not current_line else " " + word)
-            if c.stringWidth(test_line, font_name, font_size) <= max_width:
-                current_line = test_line
-            else:
-                if current_line:
-                    lines.append(current_line)
-                current_line = word
-        if current_line:
-            lines.append(current_line)
-        return lines
-
-    def draw_table(self, c, data, x_start, y_start, col_widths, row_height, height, title, date_headers, confirmed_status, hide_class_type=False):
-        y = y_start
-        rows_per_page = int((height - 150) / row_height) - 3
-        header_height = 40
-        x = x_start
-        wrapped_lines = self.wrap_text(c, data[0][0], col_widths[0] - 10, self.font_name, 10, wrap=False)
-        y_temp = y - 10
-        for line in wrapped_lines:
-            c.drawCentredString(x + col_widths[0] / 2, y_temp, line)
-            y_temp -= 12
-        x += col_widths[0]
-        date_idx = 0
-        for date, types in date_headers.items():
-            date_width = sum(col_widths[date_idx + 1:date_idx + 1 + len(types)])
-            c.drawCentredString(x + date_width / 2, y - 10, date)
-            if not hide_class_type:
-                for t_idx, class_type in enumerate(types):
-                    c.drawCentredString(x + col_widths[date_idx + 1] / 2, y - 25, class_type)
-                    x += col_widths[date_idx + 1]
-                    date_idx += 1
-            else:
-                for _ in types:
-                    x += col_widths[date_idx + 1]
-                    date_idx += 1
-        y -= header_height
-        c.line(x_start, y, x_start + sum(col_widths), y)
-        for i in range(1, len(data)):
-            if (i - 1) % rows_per_page == 0 and i != 1:
-                y -= row_height
-                x = x_start
-                c.drawCentredString(x + col_widths[0] / 2, y + 5, "Подтверждено:")
-                x += col_widths[0]
-                date_idx = 0
-                for date, types in date_headers.items():
-                    for class_type in types:
-                        is_confirmed = confirmed_status.get(date, {}).get(class_type, False)
-                        c.drawCentredString(x + col_widths[date_idx + 1] / 2, y + 5, "+" if is_confirmed else "-")
-                        x += col_widths[date_idx + 1]
-                        date_idx += 1
-                c.line(x_start, y, x_start + sum(col_widths), y)
-                c.setFont(self.font_name, 12)
-                c.drawString(50, 50, "Подпись преподавателя: ____________________")
-                c.showPage()
-                c.setFont(self.font_name, 16)
-                c.drawString(50, height - 50, title)
-                c.setFont(self.font_name, 10)
-                y = height - 80
-                x = x_start
-                wrapped_lines = self.wrap_text(c, data[0][0], col_widths[0] - 10, self.font_name, 10, wrap=False)
-                y_temp = y - 10
-                for line in wrapped_lines:
-                    c.drawCentredString(x + col_widths[0] / 2, y_temp, line)
-                    y_temp -= 12
-                x += col_widths[0]
-                date_idx = 0
-                for date, types in date_headers.items():
-                    date_width = sum(col_widths[date_idx + 1:date_idx + 1 + len(types)])
-                    c.drawCentredString(x + date_width / 2, y - 10, date)
-                    if not hide_class_type:
-                        for t_idx, class_type in enumerate(types):
-                            c.drawCentredString(x + col_widths[date_idx + 1] / 2, y - 25, class_type)
-                            x += col_widths[date_idx + 1]
-                            date_idx += 1
-                    else:
-                        for _ in types:
-                            x += col_widths[date_idx + 1]
-                            date_idx += 1
-                y -= header_height
-                c.line(x_start, y, x_start + sum(col_widths), y)
-            y -= row_height
-            x = x_start
-            for j in range(len(data[i])):
-                wrap = False if j == 0 else True
-                wrapped_lines = self.wrap_text(c, data[i][j], col_widths[j] - 10, self.font_name, 10, wrap=wrap)
-                y_temp = y + 5
-                for line in wrapped_lines[:2]:
-                    c.drawCentredString(x + col_widths[j] / 2, y_temp, line)
-                    y_temp -= 12
-                x += col_widths[j]
-            c.line(x_start, y, x_start + sum(col_widths), y)
-        y -= row_height
-        x = x_start
-        c.drawCentredString(x + col_widths[0] / 2, y + 5, "Подтверждено:")
-        x += col_widths[0]
-        date_idx = 0
-        for date, types in date_headers.items():
-            for class_type in types:
-                is_confirmed = confirmed_status.get(date, {}).get(class_type, False)
-                c.drawCentredString(x + col_widths[date_idx + 1] / 2, y + 5, "+" if is_confirmed else "-")
-                x += col_widths[date_idx + 1]
-                date_idx += 1
-        c.line(x_start, y, x_start + sum(col_widths), y)
-        x = x_start
-        for w in col_widths:
-            c.line(x, y_start, x, y)
-            x += w
-        c.line(x, y_start, x, y)
-
-    def generate_pdf(self, subject, start_date, end_date):
-        c = canvas.Canvas(f"attendance_report_{subject}.pdf", pagesize=landscape(A4))
-        width, height = landscape(A4)
-        attendance = self.attendance_data.get(subject, {})
-        filtered_dates = {}
-        for date_str in attendance:
+    def start_report_job(self, subject, start_date, end_date, report_format="pdf"):
+        # Отчет строится в отдельном потоке, окно прогресса опрашивает очередь через root.after
+        job_window = tk.Toplevel(self.root)
+        job_window.title(f"Отчет: {subject}")
+        job_window.geometry("420x150")
+        job_window.configure(padx=20, pady=20)
+
+        status_var = tk.StringVar(value="Подготовка данных...")
+        ttk.Label(job_window, textvariable=status_var, wraplength=380).pack(fill="x")
+        progress_bar = ttk.Progressbar(job_window, mode="determinate", maximum=1)
+        progress_bar.pack(fill="x", pady=10)
+
+        events = queue.Queue()
+        cancel_event = threading.Event()
+
+        def cancel():
+            cancel_event.set()
+            status_var.set("Отмена...")
+            cancel_button.configure(state="disabled")
+
+        cancel_button = ttk.Button(job_window, text="Отмена", command=cancel, width=20)
+        cancel_button.pack()
+        job_window.protocol("WM_DELETE_WINDOW", cancel)
+
+        def progress(tables_done, tables_total, pages=None):
+            events.put(("progress", tables_done, tables_total, pages))
+
+        def worker():
             try:
-                date = datetime.datetime.strptime(date_str, "%d.%m.%Y")
-                if start_date <= date <= end_date:
-                    filtered_dates[date_str] = attendance[date_str]
-            except ValueError:
-                continue
-        if self.subjects[subject]["lectures"] or self.subjects[subject]["practices"]:
-            c.setFont(self.font_name, 16)
-            c.drawString(50, height - 50, subject)
-            c.setFont(self.font_name, 10)
-            dates_types = {}
-            confirmed_status = {}
-            for date, types in filtered_dates.items():
-                for class_type in types:
-                    if "Лабораторная работа" not in class_type:
-                        if date not in dates_types:
-                            dates_types[date] = []
-                            confirmed_status[date] = {}
-                        if class_type not in dates_types[date]:
-                            dates_types[date].append(class_type)
-                            confirmed_status[date][class_type] = types[class_type].get("confirmed", False)
-            if dates_types:
-                students = self.subjects[subject]["students"]
-                dates = sorted(dates_types.keys())
-                header = ["ФИО студента"]
-                column_mapping = []
-                for date in dates:
-                    for class_type in dates_types[date]:
-                        header.append(class_type)
-                        column_mapping.append((date, class_type))
-                data = [header]
-                for student in sorted(students):
-                    row = [student]
-                    for date, class_type in column_mapping:
-                        mark = filtered_dates.get(date, {}).get(class_type, {}).get(student, "")
-                        row.append(mark)
-                    data.append(row)
-                x_start = 50
-                y_start = height - 80
-                col_widths = [150] + [60] * (len(header) - 1)
-                row_height = 20
-                hide_class_type = bool(self.subjects[subject]["labs"]) and not self.subjects[subject]["practices"]
-                self.draw_table(c, data, x_start, y_start, col_widths, row_height, height, subject, dates_types, confirmed_status, hide_class_type)
-                c.setFont(self.font_name, 12)
-                c.drawString(50, 50, "Подпись преподавателя: ____________________")
-                c.showPage()
-        if self.subjects[subject]["labs"]:
-            for subgroup, students in self.subjects[subject]["labs"].items():
-                c.setFont(self.font_name, 16)
-                c.drawString(50, height - 50, f"{subject} - Лабораторная работа - {subgroup}")
-                c.setFont(self.font_name, 10)
-                dates = sorted([d for d, t in filtered_dates.items() if f"Лабораторная работа - {subgroup}" in t])
-                header = ["ФИО студента"] + dates
-                data = [header]
-                dates_types = {date: [f"Лабораторная работа - {subgroup}"] for date in dates}
-                confirmed_status = {date: {f"Лабораторная работа - {subgroup}": filtered_dates[date][f"Лабораторная работа - {subgroup}"].get("confirmed", False)} for date in dates}
-                for student in sorted(students):
-                    row = [student]
-                    for date in dates:
-                        mark = filtered_dates.get(date, {}).get(f"Лабораторная работа - {subgroup}", {}).get(student, "")
-                        row.append(mark)
-                    data.append(row)
-                x_start = 50
-                y_start = height - 80
-                col_widths = [150] + [60] * (len(header) - 1)
-                row_height = 20
-                self.draw_table(c, data, x_start, y_start, col_widths, row_height, height, f"{subject} - Лабораторная работа - {subgroup}", dates_types, confirmed_status, hide_class_type=True)
-                c.setFont(self.font_name, 12)
-                c.drawString(50, 50, "Подпись преподавателя: ____________________")
-                c.showPage()
-        c.save()
-        messagebox.showinfo("Успех", f"PDF сгенерирован: attendance_report_{subject}.pdf")
+                # Первый отчет может дождаться фоновой загрузки reportlab и шрифта
+                report = self.report_generator()
+                from report import ReportCancelled
+            except Exception as e:
+                events.put(("error", str(e)))
+                return
+            try:
+                if report_format == "pdf":
+                    output_path = report.generate_pdf(subject, start_date, end_date,
+                                                      progress=progress, cancel_event=cancel_event)
+                else:
+                    # Выгрузка в таблицу: те же строки, что в PDF, но без отрисовки страниц
+                    from export import export_filename, export_tables
+                    output_path = export_tables(report, [subject], start_date, end_date,
+                                                export_filename(subject, start_date, end_date, report_format),
+                                                report_format, progress, cancel_event)
+                events.put(("done", output_path))
+            except ReportCancelled:
+                events.put(("cancelled",))
+            except Exception as e:
+                # Ошибка записи или отрисовки показывается как ошибка, даже если уже нажата "Отмена"
+                events.put(("error", str(e)))
+
+        def finish(text):
+            status_var.set(text)
+            cancel_button.configure(text="Закрыть", state="normal", command=job_window.destroy)
+            job_window.protocol("WM_DELETE_WINDOW", job_window.destroy)
+
+        def poll():
+            if not job_window.winfo_exists():
+                return
+            try:
+                while True:
+                    event = events.get_nowait()
+                    if event[0] == "progress":
+                        _, tables_done, tables_total, pages = event
+                        progress_bar.configure(maximum=max(tables_total, 1), value=tables_done)
+                        if not cancel_event.is_set():
+                            text = f"Таблиц готово: {tables_done} из {tables_total}"
+                            status_var.set(text if pages is None else f"{text}, страниц: {pages}")
+                    elif event[0] == "done":
+                        progress_bar.configure(value=progress_bar["maximum"])
+                        finish(f"{report_format.upper()} сгенерирован: {event[1]}")
+                        return
+                    elif event[0] == "cancelled":
+                        finish("Генерация отчета отменена")
+                        return
+                    else:
+                        finish(f"Ошибка: {event[1]}")
+                        return
+            except queue.Empty:
+                pass
+            job_window.after(100, poll)
+
+        threading.Thread(target=worker, daemon=True).start()
+        job_window.after(100, poll)
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,335 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfgen import canvas
+from app import AttendanceApp
+from report import FONT_FILE, ReportGenerator, register_font, text_layout_cache
+from stats import AttendanceMatrix, subject_summary
+from storage import DATA_DIR, LEGACY_DATA_FILE, MARKS
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Запусков каждой фазы; в результат идет самый быстрый
+DEFAULT_REPEAT = 5
+# Рост времени меньше этого (в секундах) считается шумом, а не регрессией
+MIN_SECONDS_DELTA = 0.005
+
+
+def reportlab_wrap(c, text, max_width, font_name, font_size):
+    # Перенос строк без кэша, как до появления text_layout_cache
+    c.setFont(font_name, font_size)
+    lines = []
+    current_line = ""
+    for word in text.split():
+        test_line = current_line + (word if not current_line else " " + word)
+        if c.stringWidth(test_line, font_name, font_size) <= max_width:
+            current_line = test_line
+        else:
+            if current_line:
+                lines.append(current_line)
+            current_line = word
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def layout_cells(students, sessions, seed=0):
+    rng = random.Random(seed)
+    cells = [f"Лабораторная работа - {i % 4 + 1}" for i in range(sessions)]
+    for student in range(students):
+        cells.append(f"Студент{student} Фамилия{student % 97}")
+        cells.extend(rng.choice(MARKS + [""]) for _ in range(sessions))
+    return cells
+
+
+def bench_layout(students=500, sessions=60, font_name=None):
+    font_name = font_name or register_font()
+    cells = layout_cells(students, sessions)
+    c = canvas.Canvas(io.BytesIO())
+
+    start = time.perf_counter()
+    for text in cells:
+        reportlab_wrap(c, text, 50, font_name, 10)
+    uncached = time.perf_counter() - start
+
+    text_layout_cache.clear()
+    start = time.perf_counter()
+    for text in cells:
+        text_layout_cache.wrap(text, font_name, 10, 50)
+    cached = time.perf_counter() - start
+
+    return {
+        "cells": len(cells),
+        "uncached_us_per_cell": uncached / len(cells) * 1e6,
+        "cached_us_per_cell": cached / len(cells) * 1e6,
+        "cache": text_layout_cache.stats(),
+    }
+
+
+def semester_dates(year, half, sessions):
+    # Занятия равномерно распределены по семестру (сентябрь - декабрь или февраль - май)
+    start = datetime.date(year, 9, 1) if half == 1 else datetime.date(year + 1, 2, 1)
+    step = max(120 // max(sessions, 1), 1)
+    return [(start + datetime.timedelta(days=i * step)).strftime("%d.%m.%Y") for i in range(sessions)]
+
+
+def make_fixture(directory, students=30, subjects=8, subgroups=3, sessions=16, years=1, seed=0):
+    # config.json и attendance_data.json в исходном однофайловом формате
+    rng = random.Random(seed)
+    roster = [f"Студент{i:05d} Фамилия{i % 97}" for i in range(students)]
+    config = {"students": roster, "subjects": {}}
+    data = {}
+    first_year = datetime.date.today().year - years
+    for number in range(subjects):
+        name = f"Предмет {number + 1}"
+        labs = {str(sg + 1): roster[sg::subgroups] for sg in range(subgroups)}
+        practices = number % 2 == 1
+        config["subjects"][name] = {"lectures": True, "practices": practices, "labs": labs, "students": roster}
+        types = ["Лекция"] + (["Практика"] if practices else [])
+        types += [f"Лабораторная работа - {sg}" for sg in labs]
+        dates = data[name] = {}
+        for year in range(first_year, first_year + years):
+            for half in (1, 2):
+                for date in semester_dates(year, half, sessions):
+                    dates[date] = {}
+                    for class_type in types:
+                        if "Лабораторная работа" in class_type:
+                            members = labs[class_type.split(" - ")[1]]
+                        else:
+                            members = roster
+                        session = {student: rng.choices(MARKS, (8, 1, 1))[0] for student in members}
+                        session["confirmed"] = rng.random() < 0.7
+                        dates[date][class_type] = session
+    with open(os.path.join(directory, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+    with open(os.path.join(directory, "attendance_data.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    return config
+
+
+class Timer:
+    def __init__(self, repeat=DEFAULT_REPEAT):
+        self.repeat = repeat
+        self.results = {}
+
+    def measure(self, name, func, *args, setup=None, once=False):
+        # Время - минимум из repeat запусков без tracemalloc (трассировка сама замедляет код),
+        # пиковая память - отдельным запуском под tracemalloc. setup готовит каждый запуск
+        # и в замер не входит. Фаза once (повторный запуск ничего не делает) выполняется один раз,
+        # ее память не замеряется
+        seconds = None
+        for _ in range(1 if once else self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            result = func(*args)
+            elapsed = time.perf_counter() - start
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+        self.results[name] = {"seconds": round(seconds, 6)}
+        if not once:
+            if setup:
+                setup()
+            tracemalloc.start()
+            try:
+                result = func(*args)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.results[name]["peak_kb"] = round(peak / 1024, 1)
+        return result
+
+
+def import_seconds(module="app", repeat=DEFAULT_REPEAT):
+    # Холодный импорт в отдельном процессе: столько окно ждет до появления на экране
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", code], cwd=SOURCE_DIR, capture_output=True, text=True,
+                                check=True)
+        runs.append(float(result.stdout))
+    return round(min(runs), 6)
+
+
+def reset_migration():
+    # Возврат к однофайловому формату, чтобы перенос можно было замерить повторно
+    if os.path.exists(LEGACY_DATA_FILE + ".migrated"):
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
+        shutil.copy(LEGACY_DATA_FILE + ".migrated", LEGACY_DATA_FILE)
+
+
+def headless_app():
+    # AttendanceApp без Tk: методы загрузки и сохранения окна не используют
+    return AttendanceApp.__new__(AttendanceApp)
+
+
+def run(students=30, subjects=8, subgroups=3, sessions=16, years=1, saves=50, seed=0, keep=False,
+        repeat=DEFAULT_REPEAT):
+    params = {"students": students, "subjects": subjects, "subgroups": subgroups,
+              "sessions": sessions, "years": years, "saves": saves, "seed": seed, "repeat": repeat}
+    workdir = tempfile.mkdtemp(prefix="attendance_bench_")
+    cwd = os.getcwd()
+    timer = Timer(repeat)
+    try:
+        shutil.copy(os.path.join(SOURCE_DIR, FONT_FILE), workdir)
+        make_fixture(workdir, students, subjects, subgroups, sessions, years, seed)
+        fixture_bytes = os.path.getsize(os.path.join(workdir, "attendance_data.json"))
+        os.chdir(workdir)
+
+        app = headless_app()
+        # Шрифт регистрируется один раз на процесс
+        app.font_name = timer.measure("register_font", register_font, once=True)
+        timer.measure("load_config", app.load_config)
+        # Первый запуск переносит attendance_data.json в шарды
+        timer.measure("migrate_legacy", app.load_attendance_data, setup=reset_migration)
+        app.attendance_data = timer.measure("load_attendance_data", app.load_attendance_data)
+        subject_names = list(app.subjects)
+        # Каждый запуск - с новым хранилищем, иначе шарды уже в памяти
+        stores = []
+        timer.measure("load_all_shards", lambda: [stores[-1].subject_data(name) for name in subject_names],
+                      setup=lambda: stores.append(app.load_attendance_data()))
+        stores.clear()
+
+        rng = random.Random(seed)
+        subject = subject_names[0]
+        roster = app.subjects[subject]["students"]
+        save_date = datetime.date.today().strftime("%d.%m.%Y")
+
+        def save_marks():
+            # Путь обновления save_marks: одна запись журнала на подтвержденное занятие
+            for _ in range(saves):
+                marks = {student: rng.choice(MARKS) for student in roster}
+                app.attendance_data.record_session(subject, save_date, "Лекция", marks, True)
+
+        # Журнал сворачивается перед каждым запуском, чтобы фоновое сворачивание не попадало в замер
+        timer.measure("save_marks", save_marks, setup=app.save_attendance_data)
+        timer.measure("save_attendance_data", app.save_attendance_data, setup=save_marks)
+
+        app.report = ReportGenerator(app.config_index, app.attendance_data, app.font_name)
+        generator = app.report
+        timer.measure("wrap_text", lambda: [generator.wrap_text(None, text, 50, app.font_name, 10)
+                                            for text in layout_cells(students, sessions, seed)],
+                      setup=text_layout_cache.clear)
+
+        width, height = landscape(A4)
+        header = ["ФИО студента"] + semester_dates(datetime.date.today().year - 1, 1, sessions)
+        dates_types = {date: ["Лекция"] for date in header[1:]}
+        table = [header] + [[student] + [rng.choice(MARKS) for _ in header[1:]] for student in sorted(roster)]
+
+        def draw_table():
+            c = canvas.Canvas(io.BytesIO(), pagesize=landscape(A4))
+            generator.draw_table(c, table, 50, height - 80, [150] + [60] * (len(header) - 1), 20, height,
+                                 subject, dates_types, {}, False)
+            c.save()
+
+        timer.measure("draw_table", draw_table)
+
+        def faculty_statistics():
+            # Матрицы и сводка по всем предметам без построения строк отчета
+            matrices = []
+            for name in subject_names:
+                attendance = app.attendance_data.subject_data(name)
+                sessions = [(date, class_type) for date, types in attendance.items() for class_type in types]
+                matrix = AttendanceMatrix.from_attendance(app.config_index.students[name], attendance, sessions)
+                subject_summary([matrix])
+                matrices.append(matrix)
+            return sum(matrix.nbytes() for matrix in matrices)
+
+        matrix_bytes = timer.measure("statistics", faculty_statistics)
+
+        end = datetime.datetime.now()
+        start = end - datetime.timedelta(days=365 * years + 183)
+        output_path = os.path.join(workdir, "report.pdf")
+        timer.measure("generate_pdf", generator.generate_pdf, subject, start, end, output_path)
+
+        return {
+            "params": params,
+            "python": sys.version.split()[0],
+            "import_app_seconds": import_seconds("app", repeat),
+            "fixture_bytes": fixture_bytes,
+            "pdf_bytes": os.path.getsize(output_path),
+            "matrix_bytes": matrix_bytes,
+            "layout_cache": text_layout_cache.stats(),
+            "results": timer.results,
+        }
+    finally:
+        os.chdir(cwd)
+        if keep:
+            print(f"Данные сохранены в {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(current, baseline, tolerance, min_seconds=MIN_SECONDS_DELTA):
+    # Регрессия - фаза стала медленнее или прожорливее больше чем в (1 + tolerance) раз;
+    # время вдобавок должно вырасти хотя бы на min_seconds, иначе это шум коротких фаз
+    def worse(metric, previous, value):
+        if not previous or value is None or value <= previous * (1 + tolerance):
+            return False
+        return not metric.endswith("seconds") or value - previous >= min_seconds
+
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("seconds", "peak_kb"):
+            if worse(metric, previous.get(metric), result.get(metric)):
+                regressions.append(f"{name}.{metric}: {previous[metric]} -> {result[metric]}")
+    for metric in ("import_app_seconds", "pdf_bytes"):
+        if worse(metric, baseline.get(metric), current[metric]):
+            regressions.append(f"{metric}: {baseline[metric]} -> {current[metric]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности загрузки, сохранения и отчетов "
+                                                 "на синтетических данных")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--subjects", type=int, default=8)
+    parser.add_argument("--subgroups", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=16, help="занятий каждого типа за семестр")
+    parser.add_argument("--years", type=int, default=1, help="лет истории")
+    parser.add_argument("--saves", type=int, default=50, help="сохранений занятия для замера save_marks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--layout", action="store_true", help="только сравнение переноса строк с кэшем и без")
+    parser.add_argument("--output", help="записать результат в JSON-файл")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для поиска регрессий")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимый рост относительно --compare")
+    parser.add_argument("--min-delta", type=float, default=MIN_SECONDS_DELTA,
+                        help="рост времени меньше этого (в секундах) не считается регрессией")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="запусков каждой фазы, в результат идет самый быстрый")
+    parser.add_argument("--keep", action="store_true", help="не удалять сгенерированные данные")
+    args = parser.parse_args(argv)
+
+    if args.layout:
+        print(json.dumps({"layout": bench_layout(args.students, args.sessions)}, ensure_ascii=False, indent=4))
+        return
+
+    result = run(args.students, args.subjects, args.subgroups, args.sessions, args.years, args.saves,
+                 args.seed, args.keep, args.repeat)
+    text = json.dumps(result, ensure_ascii=False, indent=4)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance, args.min_delta)
+        for line in regressions:
+            print(f"Регрессия: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import argparse
+import csv
+import os
+import re
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+from instrumentation import configure as configure_instrumentation, span
+from report import ReportCancelled, ReportGenerator, parse_date_arg, report_filename
+from storage import AttendanceStore, ConfigIndex, DATA_DIR, read_config
+
+EXPORT_FORMATS = ["csv", "xlsx"]
+# Точка с запятой - разделитель, который русский Excel открывает без мастера импорта
+CSV_DELIMITER = ";"
+SHEET_NAME_LENGTH = 31
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def export_filename(subject, start_date, end_date, export_format, prefix="attendance_export"):
+    return os.path.splitext(report_filename(subject, start_date, end_date, prefix))[0] + "." + export_format
+
+
+def available_formats():
+    return [export_format for export_format in EXPORT_FORMATS if export_format != "xlsx" or Workbook is not None]
+
+
+def table_sheet(generator, layout):
+    # Те же столбцы, что в PDF: строка дат, строка типов занятий, студенты и подтверждение
+    column_mapping = layout["column_mapping"]
+    yield ["ФИО студента"] + [date for date, _ in column_mapping]
+    yield ["Тип занятия"] + [class_type for _, class_type in column_mapping]
+    yield from generator.table_rows(layout)
+    yield ["Подтверждено"] + ["да" if layout["confirmed_status"][date][class_type] else "нет"
+                              for date, class_type in column_mapping]
+
+
+def iter_tables(generator, subjects, start_date, end_date, progress=None, cancel_event=None):
+    # Предметы читаются по очереди: следующий загружается, когда строки предыдущего уже записаны.
+    # progress(готово таблиц, известно таблиц) вызывается после каждой таблицы
+    state = {"done": 0, "total": 0}
+    config = generator.config
+    for subject in subjects:
+        layouts = generator.table_layouts(subject, start_date, end_date, config)
+        state["total"] += len(layouts)
+        for layout in layouts:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ReportCancelled(subject)
+            yield layout, table_sheet(generator, layout)
+            state["done"] += 1
+            if progress:
+                progress(state["done"], state["total"])
+
+
+def write_csv(path, tables, delimiter=CSV_DELIMITER):
+    # utf-8-sig: Excel распознает кодировку по BOM
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        for number, (layout, rows) in enumerate(tables):
+            if number:
+                writer.writerow([])
+            writer.writerow([layout["title"]])
+            writer.writerows(rows)
+
+
+def sheet_name(title, used):
+    # Ограничения Excel: до 31 символа, без []:*?/\ и без повторов; номер подгруппы
+    # не должен обрезаться, поэтому тип занятия сокращается
+    base = re.sub(r"[\[\]:*?/\\]", "_", title.replace("Лабораторная работа", "Лаб."))[:SHEET_NAME_LENGTH]
+    name = base
+    number = 1
+    while name.lower() in used:
+        number += 1
+        suffix = f" ({number})"
+        name = base[:SHEET_NAME_LENGTH - len(suffix)] + suffix
+    used.add(name.lower())
+    return name
+
+
+def write_xlsx(path, tables):
+    if Workbook is None:
+        raise ExportUnavailable("Для выгрузки в XLSX нужен пакет openpyxl")
+    # Режим write_only сбрасывает строки на диск по мере добавления
+    workbook = Workbook(write_only=True)
+    used = set()
+    for layout, rows in tables:
+        sheet = workbook.create_sheet(sheet_name(layout["title"], used))
+        sheet.append([layout["title"]])
+        for row in rows:
+            sheet.append(row)
+    if not used:
+        workbook.create_sheet("Нет занятий")
+    workbook.save(path)
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx}
+
+
+def export_tables(generator, subjects, start_date, end_date, output_path, export_format="csv",
+                  progress=None, cancel_event=None):
+    # Файл пишется во временный и подменяется целиком, чтобы отмена не оставляла обрезанную выгрузку
+    tmp_path = output_path + ".tmp"
+    try:
+        with span("export.write", format=export_format, subjects=len(subjects)):
+            WRITERS[export_format](tmp_path, iter_tables(generator, subjects, start_date, end_date,
+                                                         progress, cancel_event))
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка таблиц явки в CSV или XLSX без построения PDF")
+    parser.add_argument("--start", type=parse_date_arg, required=True, help="дата начала (ДД.ММ.ГГГГ)")
+    parser.add_argument("--end", type=parse_date_arg, required=True, help="дата окончания (ДД.ММ.ГГГГ)")
+    parser.add_argument("--subject", action="append",
+                        help="предмет или подстрока названия (можно указать несколько раз)")
+    parser.add_argument("--config", default="config.json", help="файл конфигурации группы")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="каталог с данными явки")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--output", help="имя файла (по умолчанию - по датам и формату)")
+    args = parser.parse_args(argv)
+    if args.start > args.end:
+        parser.error("Дата начала не может быть позже даты окончания!")
+    if args.format not in available_formats():
+        parser.error("Для выгрузки в XLSX нужен пакет openpyxl")
+
+    config = read_config(args.config)
+    configure_instrumentation(config.get("instrumentation"))
+    subjects = config["subjects"]
+    if args.subject:
+        subjects = {name: subject for name, subject in subjects.items()
+                    if any(pattern.lower() in name.lower() for pattern in args.subject)}
+    if not subjects:
+        parser.error("Не найдено ни одного предмета")
+    store = AttendanceStore(args.data_dir)
+    store.migrate_legacy()
+
+    output_path = args.output or f"attendance_export_{args.start:%Y%m%d}-{args.end:%Y%m%d}.{args.format}"
+    generator = ReportGenerator(ConfigIndex(subjects), store)
+    export_tables(generator, list(subjects), args.start, args.end, output_path, args.format)
+    print(f"Выгружено: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import csv
+import datetime
+import sys
+from instrumentation import configure as configure_instrumentation
+from storage import DATE_FORMAT, MARKS, AttendanceStore, DATA_DIR, class_types, parse_date, read_config, roster
+
+# Заголовки столбцов CSV с отметками (английские и как в выгрузках из таблиц)
+COLUMN_ALIASES = {
+    "subject": "subject", "предмет": "subject",
+    "date": "date", "дата": "date",
+    "class_type": "class_type", "тип занятия": "class_type",
+    "student": "student", "фио студента": "student", "студент": "student",
+    "mark": "mark", "отметка": "mark",
+    "confirmed": "confirmed", "подтверждено": "confirmed",
+}
+TRUE_VALUES = {"1", "true", "yes", "да", "+"}
+ACCESS_TIME_FORMATS = ["%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M"]
+DEFAULT_BATCH_SIZE = 200
+
+
+class ImportFailed(Exception):
+    pass
+
+
+def normalize(raw):
+    # csv.DictReader кладет лишние поля строки списком под ключ None, а недостающие заполняет None
+    return {key: value if isinstance(value, str) else "" for key, value in raw.items() if key is not None}
+
+
+def read_rows(path, delimiter=None):
+    # Строки читаются по одной: память не зависит от размера файла
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if delimiter is None:
+            sample = f.readline()
+            delimiter = ";" if sample.count(";") >= sample.count(",") else ","
+            f.seek(0)
+        reader = csv.DictReader(f, delimiter=delimiter)
+        for row in reader:
+            yield reader.line_num, row
+
+
+class Importer:
+    # Разбор строк, проверка по составу групп из config.json и пакетная запись в хранилище
+    def __init__(self, subjects, store, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, errors=None):
+        self.subjects = subjects
+        self.store = store
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.errors = errors
+        self.pending = {}
+        self.stats = {"rows": 0, "marks": 0, "errors": 0, "sessions": 0, "batches": 0}
+        self.rosters = {}
+
+    def error(self, line, reason, row):
+        self.stats["errors"] += 1
+        if self.errors is not None:
+            values = []
+            for value in row.values():
+                if isinstance(value, list):
+                    values.extend(value)
+                else:
+                    values.append(value or "")
+            self.errors.writerow([line, reason, *values])
+
+    def members(self, subject, class_type):
+        key = (subject, class_type)
+        if key not in self.rosters:
+            self.rosters[key] = frozenset(roster(self.subjects[subject], class_type))
+        return self.rosters[key]
+
+    def validate(self, subject, date, class_type):
+        # Те же проверки, что при сохранении явки в окне "Проставить явку"
+        if subject not in self.subjects:
+            return "неизвестный предмет"
+        try:
+            parse_date(date)
+        except ValueError:
+            return "неверный формат даты, нужен ДД.ММ.ГГГГ"
+        if class_type not in class_types(self.subjects[subject]):
+            return "тип занятия не предусмотрен для предмета"
+        return None
+
+    def add(self, subject, date, class_type, student, mark, confirmed):
+        # confirmed=None - флаг не задан, у занятия в хранилище остается прежний
+        key = (subject, date, class_type)
+        session = self.pending.get(key)
+        if session is None:
+            session = self.pending[key] = [{}, None]
+        session[0][student] = mark
+        if confirmed is not None:
+            session[1] = confirmed if session[1] is None else session[1] or confirmed
+        self.stats["marks"] += 1
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # Части одного занятия из разных пакетов сливаются при записи (apply_session)
+        if not self.pending:
+            return
+        sessions = [(subject, date, class_type, marks, confirmed)
+                    for (subject, date, class_type), (marks, confirmed) in self.pending.items()]
+        if not self.dry_run:
+            self.store.record_sessions(sessions)
+        self.stats["sessions"] += len(sessions)
+        self.stats["batches"] += 1
+        self.pending = {}
+
+    def import_marks(self, rows, confirmed=None):
+        for line, raw in rows:
+            self.stats["rows"] += 1
+            if None in raw:
+                self.error(line, "в строке больше полей, чем в заголовке", raw)
+                continue
+            row = {COLUMN_ALIASES.get(key.strip().lower()): value.strip() for key, value in normalize(raw).items()}
+            subject, date, class_type = row.get("subject", ""), row.get("date", ""), row.get("class_type", "")
+            student, mark = row.get("student", ""), row.get("mark", "")
+            reason = self.validate(subject, date, class_type)
+            if reason is None and student not in self.members(subject, class_type):
+                reason = "студент не числится в группе/подгруппе"
+            if reason is None and mark not in MARKS:
+                reason = f"неизвестная отметка, допустимы: {', '.join(MARKS)}"
+            if reason:
+                self.error(line, reason, raw)
+                continue
+            row_confirmed = row["confirmed"].lower() in TRUE_VALUES if row.get("confirmed") else confirmed
+            self.add(subject, date, class_type, student, mark, row_confirmed)
+        self.flush()
+        return self.stats
+
+    def import_access_log(self, rows, subject, class_type, dates, time_column, student_column,
+                          window=None, confirmed=None):
+        # Отметки турникета за дни занятий dates ("ДД.ММ.ГГГГ"): кто прошел - "есть", остальные
+        # из состава - "н". Проходы в другие дни пропускаются: по журналу не видно, было ли занятие
+        dates = set(dates)
+        if subject not in self.subjects:
+            raise ImportFailed("неизвестный предмет")
+        if class_type not in class_types(self.subjects[subject]):
+            raise ImportFailed("тип занятия не предусмотрен для предмета")
+        members = self.members(subject, class_type)
+        seen = {date: set() for date in dates}
+        for line, raw in rows:
+            self.stats["rows"] += 1
+            row = normalize(raw)
+            timestamp = parse_timestamp(row.get(time_column, ""))
+            student = row.get(student_column, "").strip()
+            if timestamp is None:
+                self.error(line, "неверное время прохода", raw)
+                continue
+            date = timestamp.strftime(DATE_FORMAT)
+            if date not in seen or window and not window[0] <= timestamp.time() <= window[1]:
+                continue
+            if student not in members:
+                self.error(line, "студент не числится в группе/подгруппе", raw)
+                continue
+            seen[date].add(student)
+        for date, present in seen.items():
+            for student in members:
+                self.add(subject, date, class_type, student, "есть" if student in present else "н", confirmed)
+        self.flush()
+        return self.stats
+
+
+def parse_timestamp(value):
+    value = value.strip()
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for time_format in ACCESS_TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_window(value):
+    try:
+        start, end = value.split("-")
+        return (datetime.datetime.strptime(start.strip(), "%H:%M").time(),
+                datetime.datetime.strptime(end.strip(), "%H:%M").time())
+    except ValueError:
+        raise argparse.ArgumentTypeError("Окно времени задается как ЧЧ:ММ-ЧЧ:ММ")
+
+
+def parse_dates(value):
+    # "01.10.2024,08.10.2024" -> ключи дат как в хранилище
+    try:
+        return [parse_date(part.strip()).strftime(DATE_FORMAT) for part in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Неверный формат даты! Используйте ДД.ММ.ГГГГ")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный импорт отметок из CSV и журналов турникетов")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="только проверить файл, ничего не записывать")
+    parser.add_argument("--errors", help="CSV-файл для отчета об ошибочных строках")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="занятий в одной записи")
+    parser.add_argument("--delimiter", help="разделитель CSV (по умолчанию определяется по первой строке)")
+    parser.add_argument("--confirmed", action="store_true",
+                        help="помечать занятия подтвержденными (иначе флаг берется из столбца или не меняется)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    marks = commands.add_parser("marks", help="CSV: предмет, дата, тип занятия, студент, отметка")
+    marks.add_argument("path")
+
+    access = commands.add_parser("access", help="журнал проходов: время и ФИО студента")
+    access.add_argument("path")
+    access.add_argument("--subject", required=True)
+    access.add_argument("--class-type", required=True)
+    access.add_argument("--date", type=parse_dates, action="extend", required=True, dest="dates",
+                        help="дни занятий ДД.ММ.ГГГГ через запятую (можно указать несколько раз)")
+    access.add_argument("--time-column", default="time")
+    access.add_argument("--student-column", default="student")
+    access.add_argument("--window", type=parse_window, help="учитывать проходы только в интервале ЧЧ:ММ-ЧЧ:ММ")
+    args = parser.parse_args(argv)
+
+    config = read_config(args.config)
+    configure_instrumentation(config.get("instrumentation"))
+    subjects = config["subjects"]
+    store = None
+    if not args.dry_run:
+        store = AttendanceStore(args.data_dir)
+        store.migrate_legacy()
+    errors_file = open(args.errors, "w", encoding="utf-8", newline="") if args.errors else None
+    try:
+        errors = csv.writer(errors_file, delimiter=";") if errors_file else None
+        if errors:
+            errors.writerow(["строка", "ошибка", "данные"])
+        importer = Importer(subjects, store, args.batch_size, args.dry_run, errors)
+        rows = read_rows(args.path, args.delimiter)
+        if args.command == "marks":
+            stats = importer.import_marks(rows, args.confirmed or None)
+        else:
+            try:
+                stats = importer.import_access_log(rows, args.subject, args.class_type, args.dates, args.time_column,
+                                                   args.student_column, args.window, args.confirmed or None)
+            except ImportFailed as e:
+                parser.error(str(e))
+        if not args.dry_run:
+            store.flush()
+    finally:
+        if errors_file:
+            errors_file.close()
+    mode = "Проверено" if args.dry_run else "Импортировано"
+    print(f"{mode}: строк {stats['rows']}, отметок {stats['marks']}, занятий {stats['sessions']}, "
+          f"пакетов {stats['batches']}, ошибок {stats['errors']}")
+    if stats["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
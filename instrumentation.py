@@ -0,0 +1,107 @@
+import contextlib
+import cProfile
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+
+# Журнал замеров: JSONL с ротацией, чтобы файл не рос на машинах преподавателей
+LOG_FILE = "attendance_metrics.jsonl"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# Включается переменными окружения или разделом "instrumentation" в config.json
+settings = {
+    "enabled": os.environ.get("ATTENDANCE_INSTRUMENTATION", "") == "1",
+    "profile_report": os.environ.get("ATTENDANCE_PROFILE_REPORT", "") == "1",
+    "log_file": os.environ.get("ATTENDANCE_METRICS_FILE", LOG_FILE),
+}
+
+logger = logging.getLogger("attendance.instrumentation")
+logger.propagate = False
+logger.setLevel(logging.INFO)
+handler_lock = threading.Lock()
+local = threading.local()
+
+
+def configure(config):
+    # config - раздел "instrumentation" из config.json, например {"enabled": true, "profile_report": true}
+    if config:
+        settings.update({key: value for key, value in config.items() if key in settings})
+
+
+def enabled():
+    return settings["enabled"]
+
+
+def emit(record):
+    with handler_lock:
+        if not logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(settings["log_file"], maxBytes=LOG_MAX_BYTES,
+                                                           backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+    record = dict(record, ts=datetime.datetime.now().isoformat(timespec="milliseconds"),
+                  pid=os.getpid(), thread=threading.current_thread().name)
+    logger.info(json.dumps(record, ensure_ascii=False))
+
+
+def record(name, seconds, **fields):
+    # Замер, измеренный вызывающим кодом (например, время до первого окна от старта процесса)
+    if settings["enabled"]:
+        emit(dict(fields, span=name, seconds=round(seconds, 6)))
+
+
+@contextlib.contextmanager
+def span(name, **fields):
+    # Включенность проверяется на выходе, чтобы учитывался и load_config, который читает флаг
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, **fields)
+
+
+def count(name, amount=1):
+    counters = getattr(local, "counters", None)
+    if counters is not None:
+        counters[name] = counters.get(name, 0) + amount
+
+
+@contextlib.contextmanager
+def counting(name, **fields):
+    # Счетчики привязаны к потоку: параллельные отчеты не смешивают значения
+    if not settings["enabled"]:
+        yield
+        return
+    previous = getattr(local, "counters", None)
+    local.counters = {}
+    try:
+        yield
+    finally:
+        counters, local.counters = local.counters, previous
+        emit(dict(fields, counters=name, values=counters))
+
+
+@contextlib.contextmanager
+def profile_report(name="report"):
+    # Профиль cProfile снимается для одного (следующего) отчета, затем флаг сбрасывается
+    with handler_lock:
+        active = settings["profile_report"]
+        settings["profile_report"] = False
+    if not active:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = f"{name}_profile_{datetime.datetime.now():%Y%m%d_%H%M%S}.prof"
+        profiler.dump_stats(path)
+        if settings["enabled"]:
+            emit({"profile": path})
@@ -0,0 +1,615 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+from instrumentation import configure as configure_instrumentation, count, counting, profile_report, settings, span
+from stats import AttendanceMatrix, subject_summary
+from storage import AttendanceStore, ConfigIndex, DATA_DIR, parse_date, read_config
+
+FONT_NAME = "OpenSans"
+FONT_FILE = "OpenSans-VariableFont_wdth,wght.ttf"
+REPORT_CACHE_DIR = "report_cache"
+REPORT_CACHE_MAX_FILES = 500
+# Меняется при любом изменении отрисовки, чтобы старые страницы в кэше не использовались
+REPORT_CACHE_VERSION = 2
+
+
+def register_font(font_name=FONT_NAME, font_file=FONT_FILE):
+    # Разбор TTF дорогой, поэтому шрифт регистрируется один раз на процесс
+    if font_name not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(font_name, font_file))
+    return font_name
+
+
+def report_filename(subject, start_date, end_date, prefix="attendance_report"):
+    # Диапазон дат в имени, чтобы отчеты за разные периоды не перезаписывали друг друга.
+    # Если при замене символов название изменилось, добавляется хэш: "A: B" и "A B" не совпадут
+    safe_subject = re.sub(r'[<>:"/\\|?*\s]+', "_", subject).strip("_")
+    if safe_subject != subject:
+        safe_subject += "_" + hashlib.sha1(subject.encode("utf-8")).hexdigest()[:6]
+    return f"{prefix}_{safe_subject}_{start_date:%Y%m%d}-{end_date:%Y%m%d}.pdf"
+
+
+class GlyphWidths:
+    # Таблица ширин глифов шрифта (в 1/1000 кегля), чтобы не ходить в reportlab за каждой строкой
+    def __init__(self, font_name):
+        font = pdfmetrics.getFont(font_name)
+        face = getattr(font, "face", None)
+        if face is not None and hasattr(face, "charWidths"):
+            self.get = face.charWidths.get
+            self.default = face.defaultWidth
+        else:
+            self.get = None
+            self.font_name = font_name
+
+    def units(self, text):
+        if self.get is None:
+            return pdfmetrics.stringWidth(text, self.font_name, 1000)
+        get, default = self.get, self.default
+        return sum(get(ord(ch), default) for ch in text)
+
+
+class TextLayoutCache:
+    # LRU-кэш переносов строк по ключу (текст, шрифт, кегль, ширина) со счетчиками попаданий
+    def __init__(self, maxsize=8192):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.glyph_tables = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def glyphs(self, font_name):
+        table = self.glyph_tables.get(font_name)
+        if table is None:
+            table = self.glyph_tables[font_name] = GlyphWidths(font_name)
+        return table
+
+    def wrap(self, text, font_name, font_size, max_width):
+        key = (text, font_name, font_size, max_width)
+        with self.lock:
+            lines = self.entries.get(key)
+            if lines is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return lines
+            self.misses += 1
+        lines = self.layout(text, self.glyphs(font_name), max_width * 1000.0 / font_size)
+        with self.lock:
+            self.entries[key] = lines
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return lines
+
+    def layout(self, text, glyphs, max_units):
+        # Ширина каждого слова меряется один раз, строка набирается суммированием
+        space = glyphs.units(" ")
+        lines = []
+        current_words = []
+        current_units = 0
+        for word in text.split():
+            word_units = glyphs.units(word)
+            test_units = word_units if not current_words else current_units + space + word_units
+            if test_units <= max_units:
+                current_words.append(word)
+                current_units = test_units
+            else:
+                if current_words:
+                    lines.append(" ".join(current_words))
+                current_words = [word]
+                current_units = word_units
+        if current_words:
+            lines.append(" ".join(current_words))
+        return tuple(lines)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.glyph_tables.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+text_layout_cache = TextLayoutCache()
+
+
+class ReportCache:
+    # Готовые страницы таблиц по ключу - хэшу всего, от чего зависит их вид:
+    # заголовок, список студентов, даты, отметки и флаги подтверждения.
+    # Включается явно: каждый фрагмент несет свое подмножество глифов шрифта,
+    # и склеенный PDF получается в 2-3 раза больше отрисованного целиком
+    def __init__(self, cache_dir=REPORT_CACHE_DIR, max_files=REPORT_CACHE_MAX_FILES):
+        self.cache_dir = cache_dir
+        self.max_files = max_files
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, font_name, table):
+        payload = json.dumps([REPORT_CACHE_VERSION, font_name, table["title"], table["data"],
+                              list(table["dates_types"].items()), table["confirmed_status"],
+                              table["hide_class_type"], table.get("summary")], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".pdf")
+
+    def get(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        # Время изменения служит меткой последнего использования для prune
+        os.utime(path)
+        return path
+
+    @contextlib.contextmanager
+    def writing(self, key):
+        tmp_path = f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            yield tmp_path
+            os.replace(tmp_path, self.path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def prune(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pdf"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    continue
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ReportCancelled(Exception):
+    pass
+
+
+class ReportGenerator:
+    # Построение PDF-отчетов без зависимости от Tk
+    def __init__(self, config, attendance_data, font_name=FONT_NAME, cache_dir=None):
+        # config - ConfigIndex; при перезагрузке config.json заменяется новым индексом
+        self.config = config
+        self.attendance_data = attendance_data
+        self.font_name = font_name
+        # Кэш страниц таблиц работает, только если установлен pypdf для склейки
+        self.cache = ReportCache(cache_dir) if cache_dir and PdfWriter is not None else None
+
+    def wrap_text(self, c, text, max_width, font_name, font_size, wrap=True):
+        count("wrap_text")
+        if not wrap:
+            return [text]
+        return text_layout_cache.wrap(text, font_name, font_size, max_width)
+
+    def draw_signature(self, c):
+        # Подпись одинакова на всех страницах документа, форма строится один раз на canvas
+        if not c.hasForm("signature"):
+            c.beginForm("signature")
+            c.setFont(self.font_name, 12)
+            c.drawString(50, 50, "Подпись преподавателя: ____________________")
+            c.endForm()
+        c.doForm("signature")
+
+    def build_table_forms(self, c, header_text, x_start, y_start, col_widths, header_height, height, title, date_headers, confirmed_status, hide_class_type):
+        # Статичное содержимое страницы таблицы (заголовок страницы, шапка, строка
+        # "Подтверждено:") собирается в Form XObject и подставляется на каждой странице
+        prefix = f"table{c.getPageNumber()}"
+        forms = {"title": prefix + "_title", "header": prefix + "_header", "confirmed": prefix + "_confirmed"}
+        table_width = sum(col_widths)
+
+        c.beginForm(forms["title"])
+        c.setFont(self.font_name, 16)
+        c.drawString(50, height - 50, title)
+        c.endForm()
+
+        c.beginForm(forms["header"])
+        c.setFont(self.font_name, 10)
+        y = y_start
+        x = x_start
+        wrapped_lines = self.wrap_text(c, header_text, col_widths[0] - 10, self.font_name, 10, wrap=False)
+        y_temp = y - 10
+        for line in wrapped_lines:
+            c.drawCentredString(x + col_widths[0] / 2, y_temp, line)
+            y_temp -= 12
+        x += col_widths[0]
+        date_idx = 0
+        for date, types in date_headers.items():
+            date_width = sum(col_widths[date_idx + 1:date_idx + 1 + len(types)])
+            c.drawCentredString(x + date_width / 2, y - 10, date)
+            if not hide_class_type:
+                for class_type in types:
+                    c.drawCentredString(x + col_widths[date_idx + 1] / 2, y - 25, class_type)
+                    x += col_widths[date_idx + 1]
+                    date_idx += 1
+            else:
+                for _ in types:
+                    x += col_widths[date_idx + 1]
+                    date_idx += 1
+        y -= header_height
+        c.line(x_start, y, x_start + table_width, y)
+        c.endForm()
+
+        # Строка подтверждения строится от нулевой высоты и сдвигается на место вывода
+        c.beginForm(forms["confirmed"], lowery=-height, uppery=height)
+        c.setFont(self.font_name, 10)
+        x = x_start
+        c.drawCentredString(x + col_widths[0] / 2, 5, "Подтверждено:")
+        x += col_widths[0]
+        date_idx = 0
+        for date, types in date_headers.items():
+            for class_type in types:
+                is_confirmed = confirmed_status.get(date, {}).get(class_type, False)
+                c.drawCentredString(x + col_widths[date_idx + 1] / 2, 5, "+" if is_confirmed else "-")
+                x += col_widths[date_idx + 1]
+                date_idx += 1
+        c.line(x_start, 0, x_start + table_width, 0)
+        c.endForm()
+        return forms
+
+    def draw_form_at(self, c, name, y):
+        c.saveState()
+        c.translate(0, y)
+        c.doForm(name)
+        c.restoreState()
+
+    def draw_table(self, c, data, x_start, y_start, col_widths, row_height, height, title, date_headers, confirmed_status, hide_class_type=False, on_page=None):
+        rows_per_page = int((height - 150) / row_height) - 3
+        header_height = 40
+        forms = self.build_table_forms(c, data[0][0], x_start, y_start, col_widths, header_height, height, title, date_headers, confirmed_status, hide_class_type)
+        c.setFont(self.font_name, 10)
+        c.doForm(forms["header"])
+        y = y_start - header_height
+        for i in range(1, len(data)):
+            if (i - 1) % rows_per_page == 0 and i != 1:
+                y -= row_height
+                self.draw_form_at(c, forms["confirmed"], y)
+                self.draw_signature(c)
+                c.showPage()
+                if on_page:
+                    on_page()
+                c.doForm(forms["title"])
+                c.doForm(forms["header"])
+                c.setFont(self.font_name, 10)
+                y = y_start - header_height
+            y -= row_height
+            x = x_start
+            for j in range(len(data[i])):
+                wrap = False if j == 0 else True
+                wrapped_lines = self.wrap_text(c, data[i][j], col_widths[j] - 10, self.font_name, 10, wrap=wrap)
+                y_temp = y + 5
+                for line in wrapped_lines[:2]:
+                    c.drawCentredString(x + col_widths[j] / 2, y_temp, line)
+                    y_temp -= 12
+                x += col_widths[j]
+            c.line(x_start, y, x_start + sum(col_widths), y)
+        y -= row_height
+        self.draw_form_at(c, forms["confirmed"], y)
+        x = x_start
+        for w in col_widths:
+            c.line(x, y_start, x, y)
+            x += w
+        c.line(x, y_start, x, y)
+
+    def generate_pdf(self, subject, start_date, end_date, output_path=None, progress=None, cancel_event=None):
+        # progress(готово таблиц, всего таблиц, страниц) вызывается после каждой страницы;
+        # установленный cancel_event прерывает генерацию на границе страницы
+        with profile_report(), counting("report", subject=subject), span("report.generate_pdf", subject=subject):
+            return self.render_pdf(subject, start_date, end_date, output_path, progress, cancel_event)
+
+    def table_layouts(self, subject, start_date, end_date, config=None):
+        # Состав таблиц отчета без строк: лекции/практики и по одной на каждую подгруппу
+        # лабораторных. Строки выдает table_rows, поэтому PDF и выгрузка в таблицы собирают их одинаково.
+        # Индекс конфигурации читается один раз: перезагрузка config.json не смешивает версии в отчете
+        config = config or self.config
+        with span("report.filter", subject=subject):
+            attendance = self.attendance_data.subject_data(subject, start_date, end_date)
+            index = self.attendance_data.date_index(subject)
+            # Ключи дат в хронологическом порядке
+            filtered_dates = {date: attendance[date] for date in index.range(start_date, end_date) if date in attendance}
+        if subject not in config.subjects:
+            raise ValueError(f"Предмета \"{subject}\" нет в config.json")
+        subject_config = config.subjects[subject]
+        layouts = []
+        if subject_config["lectures"] or subject_config["practices"]:
+            dates_types = {}
+            confirmed_status = {}
+            for date, types in filtered_dates.items():
+                for class_type in types:
+                    if "Лабораторная работа" not in class_type:
+                        if date not in dates_types:
+                            dates_types[date] = []
+                            confirmed_status[date] = {}
+                        if class_type not in dates_types[date]:
+                            dates_types[date].append(class_type)
+                            confirmed_status[date][class_type] = types[class_type].get("confirmed", False)
+            if dates_types:
+                header = ["ФИО студента"]
+                column_mapping = []
+                for date in dates_types:
+                    for class_type in dates_types[date]:
+                        header.append(class_type)
+                        column_mapping.append((date, class_type))
+                hide_class_type = bool(subject_config["labs"]) and not subject_config["practices"]
+                layouts.append({"name": "lectures", "title": subject, "students": config.students[subject],
+                                "header": header, "column_mapping": column_mapping, "dates_types": dates_types,
+                                "confirmed_status": confirmed_status, "hide_class_type": hide_class_type,
+                                "attendance": filtered_dates})
+        if subject_config["labs"]:
+            for subgroup, students in config.labs[subject].items():
+                class_type = f"Лабораторная работа - {subgroup}"
+                dates = index.range(start_date, end_date, class_type)
+                confirmed_status = {date: {class_type: filtered_dates.get(date, {}).get(class_type, {}).get("confirmed", False)}
+                                    for date in dates}
+                layouts.append({"name": f"lab {subgroup}", "title": f"{subject} - {class_type}", "students": students,
+                                "header": ["ФИО студента"] + dates, "column_mapping": [(date, class_type) for date in dates],
+                                "dates_types": {date: [class_type] for date in dates}, "confirmed_status": confirmed_status,
+                                "hide_class_type": True, "attendance": filtered_dates})
+        return layouts
+
+    @staticmethod
+    def table_rows(layout):
+        # Строки студентов по одной, без сборки всей таблицы в памяти
+        attendance = layout["attendance"]
+        for student in layout["students"]:
+            yield [student] + [attendance.get(date, {}).get(class_type, {}).get(student, "")
+                               for date, class_type in layout["column_mapping"]]
+
+    def build_tables(self, subject, start_date, end_date):
+        # Данные всех таблиц отчета вместе с матрицами для сводки
+        tables = []
+        for layout in self.table_layouts(subject, start_date, end_date):
+            with span("report.build_table", subject=subject, table=layout["name"]):
+                data = [layout["header"]] + list(self.table_rows(layout))
+            matrix = AttendanceMatrix.from_attendance(layout["students"], layout["attendance"], layout["column_mapping"])
+            tables.append({"name": layout["name"], "title": layout["title"], "data": data,
+                           "dates_types": layout["dates_types"], "confirmed_status": layout["confirmed_status"],
+                           "hide_class_type": layout["hide_class_type"], "matrix": matrix})
+        if tables:
+            with span("report.summary", subject=subject):
+                summary = subject_summary([table["matrix"] for table in tables])
+            rows = [[student, "—" if percent is None else f"{percent:g}%", str(absent), str(excused)]
+                    for student, percent, absent, excused in summary["students"]]
+            tables.append({"name": "summary", "kind": "summary", "title": f"{subject} - Сводка посещаемости",
+                           "data": [["ФИО студента", "Посещаемость", "н", "б"]] + rows, "dates_types": {},
+                           "confirmed_status": {}, "hide_class_type": True, "summary": summary})
+        return tables
+
+    def draw_table_pages(self, c, subject, table, on_page):
+        if table.get("kind") == "summary":
+            return self.draw_summary_pages(c, subject, table, on_page)
+        width, height = landscape(A4)
+        data = table["data"]
+        c.setFont(self.font_name, 16)
+        c.drawString(50, height - 50, table["title"])
+        c.setFont(self.font_name, 10)
+        x_start = 50
+        y_start = height - 80
+        col_widths = [150] + [60] * (len(data[0]) - 1)
+        row_height = 20
+        with span("report.draw_table", subject=subject, table=table["name"], rows=len(data) - 1):
+            self.draw_table(c, data, x_start, y_start, col_widths, row_height, height, table["title"],
+                            table["dates_types"], table["confirmed_status"], table["hide_class_type"], on_page)
+        count("rows_drawn", len(data) - 1)
+        self.draw_signature(c)
+        c.showPage()
+        on_page(table_done=True)
+
+    def draw_summary_pages(self, c, subject, table, on_page):
+        width, height = landscape(A4)
+        summary = table["summary"]
+        col_x = [50, 300, 420, 480, 540]
+        types_line = ", ".join(f"{class_type}: {'—' if percent is None else f'{percent:g}%'}"
+                               for class_type, percent in summary["types"].items())
+
+        def page_header():
+            c.setFont(self.font_name, 16)
+            c.drawString(50, height - 50, table["title"])
+            c.setFont(self.font_name, 10)
+            y = height - 75
+            for line in self.wrap_text(c, "По типам занятий: " + types_line, width - 100, self.font_name, 10):
+                c.drawString(50, y, line)
+                y -= 14
+            y -= 6
+            for x, text in zip(col_x, table["data"][0]):
+                c.drawString(x, y, text)
+            c.line(50, y - 5, col_x[-1] + 100, y - 5)
+            return y - 20
+
+        below = {student for student, _ in summary["below"]}
+        y = page_header()
+        for row in table["data"][1:]:
+            if y < 100:
+                self.draw_signature(c)
+                c.showPage()
+                on_page()
+                y = page_header()
+            for x, text in zip(col_x, row):
+                c.drawString(x, y, text)
+            if row[0] in below:
+                c.drawString(col_x[-1], y, f"ниже {summary['threshold']}%")
+            y -= 16
+        count("rows_drawn", len(table["data"]) - 1)
+        if y < 130:
+            self.draw_signature(c)
+            c.showPage()
+            on_page()
+            c.setFont(self.font_name, 10)
+            y = height - 60
+        y -= 10
+        c.drawString(50, y, f"Студентов с посещаемостью ниже {summary['threshold']}%: {len(summary['below'])}")
+        if summary["worst_sessions"]:
+            y -= 16
+            worst = ", ".join(f"{date} ({class_type}) - {percent:g}%"
+                              for percent, (date, class_type) in summary["worst_sessions"][:3])
+            c.drawString(50, y, "Наименьшая посещаемость: " + worst)
+        self.draw_signature(c)
+        c.showPage()
+        on_page(table_done=True)
+
+    def render_pdf(self, subject, start_date, end_date, output_path, progress, cancel_event):
+        if output_path is None:
+            output_path = report_filename(subject, start_date, end_date)
+        tables = self.build_tables(subject, start_date, end_date)
+        state = {"tables": 0, "pages": 0}
+
+        def on_page(table_done=False):
+            count("pages")
+            state["pages"] += 1
+            if table_done:
+                state["tables"] += 1
+            if progress:
+                progress(state["tables"], len(tables), state["pages"])
+            if cancel_event is not None and cancel_event.is_set():
+                raise ReportCancelled(subject)
+
+        if self.cache is not None and tables:
+            return self.render_cached(subject, tables, output_path, on_page)
+        c = canvas.Canvas(output_path, pagesize=landscape(A4))
+        if not tables:
+            # Пустой отчет - одна страница с названием предмета
+            width, height = landscape(A4)
+            c.setFont(self.font_name, 16)
+            c.drawString(50, height - 50, subject)
+            c.showPage()
+        for table in tables:
+            self.draw_table_pages(c, subject, table, on_page)
+        with span("report.save", subject=subject):
+            c.save()
+        return output_path
+
+    def render_cached(self, subject, tables, output_path, on_page):
+        # Таблица с неизменным хэшем данных берется готовыми страницами из кэша,
+        # перерисовываются только изменившиеся, затем все склеиваются в один PDF
+        writer = PdfWriter()
+        for table in tables:
+            key = self.cache.key(self.font_name, table)
+            fragment = self.cache.get(key)
+            if fragment is None:
+                count("tables_rendered")
+                with self.cache.writing(key) as tmp_path:
+                    c = canvas.Canvas(tmp_path, pagesize=landscape(A4))
+                    self.draw_table_pages(c, subject, table, on_page)
+                    c.save()
+                fragment = self.cache.get(key)
+                writer.append(fragment)
+            else:
+                count("tables_cached")
+                pages_before = len(writer.pages)
+                writer.append(fragment)
+                for _ in range(len(writer.pages) - pages_before - 1):
+                    on_page()
+                on_page(table_done=True)
+        with span("report.save", subject=subject):
+            with open(output_path, "wb") as f:
+                writer.write(f)
+        self.cache.prune()
+        return output_path
+
+
+def init_worker(instrumentation=None):
+    # Настройки замеров родителя: при запуске через spawn (Windows) процесс их не наследует
+    configure_instrumentation(instrumentation)
+    register_font()
+
+
+def render_subject(subject, subjects, data_dir, start_date, end_date, output_dir, prefix, cache_dir):
+    # Каждый процесс читает только шарды своего предмета и получает только его конфигурацию
+    generator = ReportGenerator(ConfigIndex(subjects), AttendanceStore(data_dir), FONT_NAME, cache_dir)
+    output_path = os.path.join(output_dir, report_filename(subject, start_date, end_date, prefix))
+    return generator.generate_pdf(subject, start_date, end_date, output_path)
+
+
+def generate_reports(subjects, start_date, end_date, data_dir=DATA_DIR, output_dir="reports",
+                     prefix="attendance_report", jobs=None, cache_dir=None):
+    # Ошибка одного предмета не прерывает остальные: ({предмет: путь}, {предмет: исключение})
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    failures = {}
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(dict(settings),)) as executor:
+        # В задачу передается один предмет: иначе каждая задача копировала бы и индексировала весь config
+        futures = {executor.submit(render_subject, subject, {subject: subjects[subject]}, data_dir, start_date,
+                                   end_date, output_dir, prefix, cache_dir): subject
+                   for subject in subjects}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                failures[futures[future]] = e
+    return results, failures
+
+
+def parse_date_arg(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Неверный формат даты! Используйте ДД.ММ.ГГГГ")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная генерация PDF-отчетов по всем предметам")
+    parser.add_argument("--start", type=parse_date_arg, required=True, help="дата начала (ДД.ММ.ГГГГ)")
+    parser.add_argument("--end", type=parse_date_arg, required=True, help="дата окончания (ДД.ММ.ГГГГ)")
+    parser.add_argument("--subject", action="append",
+                        help="предмет или подстрока названия (можно указать несколько раз)")
+    parser.add_argument("--config", default="config.json", help="файл конфигурации группы")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="каталог с данными явки")
+    parser.add_argument("--output-dir", default="reports", help="каталог для PDF")
+    parser.add_argument("--prefix", default="attendance_report",
+                        help="префикс имен файлов, например название группы")
+    parser.add_argument("--cache", action="store_true",
+                        help="брать неизменившиеся таблицы из кэша (нужен pypdf): повторные отчеты "
+                             "строятся быстрее, но PDF в 2-3 раза больше из-за шрифта в каждой таблице")
+    parser.add_argument("--cache-dir", default=REPORT_CACHE_DIR, help="каталог кэша готовых таблиц")
+    parser.add_argument("--jobs", type=int, default=None, help="число процессов (по умолчанию - число ядер)")
+    args = parser.parse_args(argv)
+    if args.start > args.end:
+        parser.error("Дата начала не может быть позже даты окончания!")
+
+    config = read_config(args.config)
+    configure_instrumentation(config.get("instrumentation"))
+    subjects = config["subjects"]
+    if args.subject:
+        subjects = {name: subject for name, subject in subjects.items()
+                    if any(pattern.lower() in name.lower() for pattern in args.subject)}
+    if not subjects:
+        parser.error("Не найдено ни одного предмета")
+    # Перенос старого формата выполняется один раз, до запуска процессов
+    AttendanceStore(args.data_dir).migrate_legacy()
+
+    results, failures = generate_reports(subjects, args.start, args.end, args.data_dir, args.output_dir,
+                                         args.prefix, args.jobs, args.cache_dir if args.cache else None)
+    for subject in subjects:
+        if subject in results:
+            print(f"{subject}: {results[subject]}")
+    for subject, error in failures.items():
+        print(f"{subject}: ошибка: {error}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from storage import DEFAULT_HOST, DEFAULT_PORT, MARKS, AttendanceStore, DATA_DIR, DateIndex, apply_session, parse_date, snapshot
+# Заявки, пришедшие в пределах окна, записываются одним пакетом
+BATCH_DELAY = 0.05
+BATCH_SIZE = 500
+# Пауза перед повторным подключением подписки после обрыва
+RECONNECT_DELAY = 1.0
+
+
+def submitted_session(request):
+    # Заявка проверяется до очереди: ошибочная не должна попасть в пакет с чужими занятиями
+    subject, date, class_type, marks = (request.get(key) for key in ("subject", "date", "class_type", "marks"))
+    if not isinstance(subject, str) or not isinstance(class_type, str):
+        raise ValueError("предмет и тип занятия должны быть строками")
+    try:
+        parse_date(date)
+    except (TypeError, ValueError):
+        raise ValueError("неверная дата занятия, нужна ДД.ММ.ГГГГ")
+    if not isinstance(marks, dict) or not all(isinstance(student, str) and mark in MARKS
+                                              for student, mark in marks.items()):
+        raise ValueError(f"отметки - объект {{студент: отметка}}, допустимы: {', '.join(MARKS)}")
+    confirmed = request.get("confirmed")
+    return subject, date, class_type, marks, None if confirmed is None else bool(confirmed)
+
+
+class AttendanceServer:
+    # Локальный сервис, единолично владеющий хранилищем. Клиенты AttendanceApp
+    # присылают занятия строками JSON по TCP; заявки копятся и пишутся пакетом
+    # через record_sessions, после чего подписчики получают уведомление о том,
+    # какие даты предмета изменились.
+    def __init__(self, store, host=DEFAULT_HOST, port=DEFAULT_PORT, batch_delay=BATCH_DELAY, batch_size=BATCH_SIZE):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+        # Все обращения к хранилищу идут через один поток, поэтому чтения не пересекаются с записью
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue = None
+        self.subscribers = set()
+        self.connections = {}
+        self.server = None
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.writer_task = asyncio.create_task(self.write_batches())
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        self.server.close()
+        # Открытые соединения клиентов закрываются, чтобы они сразу узнали об остановке
+        # (начиная с Python 3.12 wait_closed еще и ждет их закрытия)
+        await self.close_connections()
+        await self.server.wait_closed()
+        await self.close_connections()
+        self.writer_task.cancel()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.store.flush)
+
+    async def close_connections(self):
+        while self.connections:
+            for writer in list(self.connections):
+                writer.close()
+            await asyncio.gather(*self.connections.values(), return_exceptions=True)
+
+    async def call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def handle(self, reader, writer):
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    response = await self.dispatch(request, writer)
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                if response is not None:
+                    response["id"] = request.get("id") if isinstance(request, dict) else None
+                    await self.send(writer, response)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            self.connections.pop(writer, None)
+            writer.close()
+
+    async def send(self, writer, message):
+        writer.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    async def dispatch(self, request, writer):
+        op = request.get("op")
+        if op == "submit":
+            session = submitted_session(request)
+            future = asyncio.get_running_loop().create_future()
+            await self.queue.put((session, future))
+            await future
+            return {"ok": True}
+        if op == "subject":
+            text = await self.call(self.subject_json, request["subject"])
+            return {"ok": True, "data": json.loads(text)}
+        if op == "subscribe":
+            self.subscribers.add(writer)
+            return {"ok": True}
+        if op == "ping":
+            return {"ok": True}
+        raise ValueError(f"неизвестная операция: {op}")
+
+    def subject_json(self, subject):
+        # Сериализация в потоке хранилища дает согласованный снимок предмета
+        return json.dumps(self.store.subject_data(subject), ensure_ascii=False)
+
+    async def write_batches(self):
+        while True:
+            batch = [await self.queue.get()]
+            await asyncio.sleep(self.batch_delay)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            sessions = [session for session, _ in batch]
+            try:
+                await self.call(self.store.record_sessions, sessions)
+            except Exception:
+                # Пакет не записан целиком: занятия повторяются по одному, чтобы ошибка одного
+                # не досталась остальным (повтор уже записанных безопасен, apply_session идемпотентна)
+                sessions = []
+                for session, future in batch:
+                    try:
+                        await self.call(self.store.record_session, *session)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                        continue
+                    sessions.append(session)
+                    if not future.done():
+                        future.set_result(True)
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(True)
+            if sessions:
+                await self.notify(sessions)
+
+    async def notify(self, sessions):
+        changed = {}
+        for subject, date, *_ in sessions:
+            changed.setdefault(subject, set()).add(date)
+        for subscriber in list(self.subscribers):
+            try:
+                for subject, dates in changed.items():
+                    await self.send(subscriber, {"event": "changed", "subject": subject, "dates": sorted(dates)})
+            except ConnectionError:
+                self.subscribers.discard(subscriber)
+
+
+class RemoteStore:
+    # Клиентская замена AttendanceStore для AttendanceApp: данные предмета
+    # запрашиваются у сервиса и кэшируются до уведомления об изменении
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=30):
+        self.host = host
+        self.port = port
+        self.lock = threading.RLock()
+        self.subjects = {}
+        self.indexes = {}
+        self.timeout = timeout
+        self.request_id = 0
+        self.connection = None
+        self.connect()
+        threading.Thread(target=self.listen, daemon=True).start()
+
+    def connect(self):
+        self.connection = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.responses = self.connection.makefile("r", encoding="utf-8")
+
+    def request(self, message):
+        with self.lock:
+            self.request_id += 1
+            data = (json.dumps(dict(message, id=self.request_id), ensure_ascii=False) + "\n").encode("utf-8")
+            try:
+                response = self.exchange(data)
+            except (OSError, ValueError):
+                # Сервис перезапущен или соединение оборвано: одна повторная попытка по новому
+                # соединению (повтор записи безопасен, apply_session идемпотентна)
+                self.connection.close()
+                self.connect()
+                response = self.exchange(data)
+        if not response.get("ok"):
+            raise Exception(response.get("error", "ошибка сервиса явки"))
+        return response
+
+    def exchange(self, data):
+        self.connection.sendall(data)
+        line = self.responses.readline()
+        if not line:
+            raise ConnectionError("сервис явки закрыл соединение")
+        return json.loads(line)
+
+    def listen(self):
+        # Отдельное соединение подписки: измененный предмет будет перечитан при следующем обращении.
+        # Пока подписки нет, изменения не видны, поэтому при обрыве и после переподключения
+        # кэш сбрасывается целиком
+        while True:
+            try:
+                with socket.create_connection((self.host, self.port)) as connection:
+                    connection.sendall(b'{"op": "subscribe"}\n')
+                    with self.lock:
+                        self.subjects.clear()
+                    for line in connection.makefile("r", encoding="utf-8"):
+                        message = json.loads(line)
+                        if message.get("event") == "changed":
+                            # Индекс остается до перечитывания: он соответствует уже выданным данным
+                            with self.lock:
+                                self.subjects.pop(message["subject"], None)
+            except (OSError, ValueError):
+                pass
+            with self.lock:
+                self.subjects.clear()
+            time.sleep(RECONNECT_DELAY)
+
+    def subject_data(self, subject, start_date=None, end_date=None):
+        with self.lock:
+            return snapshot(self.fetch(subject))
+
+    def fetch(self, subject):
+        with self.lock:
+            if subject not in self.subjects:
+                data = self.request({"op": "subject", "subject": subject})["data"]
+                index = DateIndex()
+                for date, types in data.items():
+                    index.add(date, types)
+                self.subjects[subject] = data
+                self.indexes[subject] = index
+            return self.subjects[subject]
+
+    def load_shard(self, subject, semester):
+        return self.fetch(subject)
+
+    def date_index(self, subject):
+        with self.lock:
+            return self.indexes.get(subject, DateIndex())
+
+    def record_session(self, subject, date, class_type, marks, confirmed):
+        self.record_sessions([(subject, date, class_type, marks, confirmed)])
+
+    def record_sessions(self, sessions):
+        for subject, date, class_type, marks, confirmed in sessions:
+            self.request({"op": "submit", "subject": subject, "date": date, "class_type": class_type,
+                          "marks": marks, "confirmed": confirmed})
+            with self.lock:
+                if subject in self.subjects:
+                    apply_session(self.subjects[subject], date, class_type, marks, confirmed)
+                    self.indexes[subject].add(date, [class_type])
+
+    def flush(self):
+        pass
+
+    def migrate_legacy(self):
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальный сервис явки для нескольких экземпляров приложения")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args(argv)
+
+    store = AttendanceStore(args.data_dir)
+    store.migrate_legacy()
+    server = AttendanceServer(store, args.host, args.port)
+    print(f"Сервис явки слушает {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        store.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from array import array
+
+# Коды отметок в матрице: 0 - отметки нет (студент не был записан на занятие)
+MARK_CODES = {"": 0, "есть": 1, "н": 2, "б": 3}
+PRESENT, ABSENT, EXCUSED = 1, 2, 3
+# Порог посещаемости в процентах для списка отстающих
+ATTENDANCE_THRESHOLD = 70
+
+
+class AttendanceMatrix:
+    # Компактное представление явки одной таблицы: порядковые номера студентов
+    # и занятий и матрица кодов отметок (по байту на ячейку, построчно по студентам).
+    # Агрегаты считаются через bytes.count по строкам и срезам с шагом по столбцам,
+    # то есть в C, без обхода вложенных словарей в Python.
+    def __init__(self, students, sessions, cells, confirmed):
+        self.students = tuple(students)
+        self.sessions = tuple(sessions)
+        self.cells = cells
+        self.confirmed = confirmed
+
+    @classmethod
+    def from_attendance(cls, students, attendance, sessions):
+        # students - упорядоченный список, attendance - дата -> тип -> {студент: отметка},
+        # sessions - список пар (дата, тип занятия)
+        students = tuple(students)
+        width = len(sessions)
+        cells = bytearray(len(students) * width)
+        confirmed = array("b", bytes(width))
+        for column, (date, class_type) in enumerate(sessions):
+            session = attendance.get(date, {}).get(class_type, {})
+            confirmed[column] = bool(session.get("confirmed", False))
+            cells[column::width] = bytes(MARK_CODES.get(session.get(student, ""), 0) for student in students)
+        return cls(students, sessions, cells, confirmed)
+
+    def row(self, index):
+        width = len(self.sessions)
+        return self.cells[index * width:(index + 1) * width]
+
+    def column(self, index):
+        return self.cells[index::len(self.sessions)]
+
+    def student_counts(self, code):
+        return [self.row(i).count(code) for i in range(len(self.students))]
+
+    def session_counts(self, code):
+        return [self.column(j).count(code) for j in range(len(self.sessions))]
+
+    @staticmethod
+    def percentages(present, absent, excused):
+        return [round(100 * p / (p + a + e), 1) if p + a + e else None
+                for p, a, e in zip(present, absent, excused)]
+
+    def student_percentages(self):
+        # Доля "есть" среди занятий, на которых у студента стоит отметка
+        return self.percentages(*(self.student_counts(code) for code in (PRESENT, ABSENT, EXCUSED)))
+
+    def session_percentages(self):
+        return self.percentages(*(self.session_counts(code) for code in (PRESENT, ABSENT, EXCUSED)))
+
+    def type_totals(self):
+        # Тип занятия -> [есть, н, б] по всем занятиям этого типа
+        totals = {}
+        counts = [self.session_counts(code) for code in (PRESENT, ABSENT, EXCUSED)]
+        for column, (_, class_type) in enumerate(self.sessions):
+            total = totals.setdefault(class_type, [0, 0, 0])
+            for k in range(3):
+                total[k] += counts[k][column]
+        return totals
+
+    def below_threshold(self, threshold=ATTENDANCE_THRESHOLD):
+        return [(student, percent) for student, percent in zip(self.students, self.student_percentages())
+                if percent is not None and percent < threshold]
+
+    def nbytes(self):
+        return len(self.cells) + len(self.confirmed)
+
+
+def subject_summary(matrices, threshold=ATTENDANCE_THRESHOLD):
+    # Сводка по предмету из матриц всех его таблиц (лекции/практики и подгруппы)
+    students = {}
+    types = {}
+    worst_sessions = []
+    for matrix in matrices:
+        columns = [matrix.student_counts(code) for code in (PRESENT, ABSENT, EXCUSED)]
+        for i, student in enumerate(matrix.students):
+            total = students.setdefault(student, [0, 0, 0])
+            for k in range(3):
+                total[k] += columns[k][i]
+        for class_type, counts in matrix.type_totals().items():
+            total = types.setdefault(class_type, [0, 0, 0])
+            for k in range(3):
+                total[k] += counts[k]
+        for session, percent in zip(matrix.sessions, matrix.session_percentages()):
+            if percent is not None:
+                worst_sessions.append((percent, session))
+    names = sorted(students)
+    percents = AttendanceMatrix.percentages(*zip(*(students[name] for name in names))) if names else []
+    return {
+        "students": [(name, percent, students[name][1], students[name][2]) for name, percent in zip(names, percents)],
+        "types": {class_type: AttendanceMatrix.percentages([p], [a], [e])[0] for class_type, (p, a, e) in types.items()},
+        "below": [(name, percent) for name, percent in zip(names, percents) if percent is not None and percent < threshold],
+        "worst_sessions": sorted(worst_sessions)[:5],
+        "threshold": threshold,
+    }
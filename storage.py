@@ -0,0 +1,578 @@
+import bisect
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import threading
+from types import MappingProxyType
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+from instrumentation import span
+
+DATA_DIR = "attendance_data"
+MANIFEST_FILE = "manifest.json"
+# Блокировка каталога данных между процессами (приложение, импорт, пакетные отчеты, сервис)
+LOCK_FILE = ".lock"
+# Однофайловый формат предыдущих версий (снимок + журнал)
+LEGACY_DATA_FILE = "attendance_data.json"
+LEGACY_JOURNAL_FILE = "attendance_journal.jsonl"
+# После скольких записей журналы сворачиваются обратно в снимки
+COMPACT_THRESHOLD = 200
+# Шард для ключей, которые не разбираются как дата
+UNKNOWN_SEMESTER = "unknown"
+
+
+# Адрес общего сервиса явки (service.py) по умолчанию
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+# Возможные отметки, первая - значение по умолчанию
+MARKS = ["есть", "н", "б"]
+DATE_FORMAT = "%d.%m.%Y"
+
+
+def parse_date(date_str):
+    # Единое правило для дат занятий: ДД.ММ.ГГГГ, иначе ValueError
+    return datetime.datetime.strptime(date_str, DATE_FORMAT)
+
+
+def class_types(subject_config):
+    types = []
+    if subject_config["lectures"]:
+        types.append("Лекция")
+    if subject_config["practices"]:
+        types.append("Практика")
+    if subject_config["labs"]:
+        types.extend([f"Лабораторная работа - {sg}" for sg in subject_config["labs"].keys()])
+    return types
+
+
+def roster(subject_config, class_type):
+    if "Лабораторная работа" in class_type:
+        subgroup = class_type.split(" - ")[1]
+        return subject_config["labs"].get(subgroup, [])
+    return subject_config["students"]
+
+
+def read_config(path="config.json"):
+    if not os.path.exists(path):
+        raise Exception(f"Файл {path} не найден!")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def server_address(config):
+    # Адрес сервиса из переменной ATTENDANCE_SERVER ("хост:порт") или раздела "server" в config.json
+    value = os.environ.get("ATTENDANCE_SERVER")
+    if value:
+        host, port = value.rsplit(":", 1)
+        return host, int(port)
+    server = config.get("server")
+    if server:
+        return server.get("host", DEFAULT_HOST), int(server.get("port", DEFAULT_PORT))
+    return None
+
+
+class ConfigIndex:
+    # Неизменяемый индекс предметов из config.json, строится один раз на версию файла:
+    # типы занятий предмета, отсортированные составы групп и подгрупп,
+    # занятия каждого студента. При перезагрузке конфигурации индекс не меняется,
+    # а заменяется новым целиком
+    def __init__(self, subjects, version=None):
+        self.version = version
+        self.subjects = MappingProxyType(dict(subjects))
+        types = {}
+        students = {}
+        labs = {}
+        student_sessions = {}
+        for name, subject_config in subjects.items():
+            types[name] = tuple(class_types(subject_config))
+            students[name] = tuple(sorted(subject_config["students"]))
+            labs[name] = MappingProxyType({subgroup: tuple(sorted(members))
+                                           for subgroup, members in subject_config["labs"].items()})
+            for class_type in types[name]:
+                for student in self.members(students[name], labs[name], class_type):
+                    student_sessions.setdefault(student, []).append((name, class_type))
+        self.types = MappingProxyType(types)
+        self.students = MappingProxyType(students)
+        self.labs = MappingProxyType(labs)
+        self.student_sessions = MappingProxyType({student: tuple(sessions)
+                                                  for student, sessions in student_sessions.items()})
+
+    @staticmethod
+    def members(students, labs, class_type):
+        if "Лабораторная работа" in class_type:
+            return labs.get(class_type.split(" - ")[1], ())
+        return students
+
+    def class_types(self, subject):
+        return self.types.get(subject, ())
+
+    def roster(self, subject, class_type):
+        # Уже отсортированный состав для занятия; пустой для неизвестного предмета
+        if subject not in self.students:
+            return ()
+        return self.members(self.students[subject], self.labs[subject], class_type)
+
+
+class ConfigWatcher:
+    # Следит за config.json по времени изменения; индекс пересобирается, только если
+    # изменилось содержимое (хэш), а недописанный файл пропускается до следующей записи
+    def __init__(self, path="config.json"):
+        self.path = path
+        self.mtime = None
+        self.version = None
+
+    def read(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        return mtime, raw, hashlib.sha256(raw).hexdigest()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            raise Exception(f"Файл {self.path} не найден!")
+        self.mtime, raw, self.version = self.read()
+        config = json.loads(raw)
+        return config, ConfigIndex(config["subjects"], self.version)
+
+    def poll(self):
+        # (config, индекс) после изменения файла, иначе None
+        try:
+            if os.stat(self.path).st_mtime_ns == self.mtime:
+                return None
+            mtime, raw, version = self.read()
+        except OSError:
+            return None
+        self.mtime = mtime
+        if version == self.version:
+            return None
+        try:
+            config = json.loads(raw)
+            index = ConfigIndex(config["subjects"], version)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+        self.version = version
+        return config, index
+
+
+def semester_of(date_str):
+    # Осенний семестр: сентябрь - январь, весенний: февраль - август
+    try:
+        date = parse_date(date_str)
+    except ValueError:
+        return UNKNOWN_SEMESTER
+    if date.month >= 9:
+        return f"{date.year}-1"
+    if date.month == 1:
+        return f"{date.year - 1}-1"
+    return f"{date.year - 1}-2"
+
+
+def semester_bounds(semester):
+    year, half = semester.split("-")
+    year = int(year)
+    if half == "1":
+        return datetime.datetime(year, 9, 1), datetime.datetime(year + 1, 2, 1) - datetime.timedelta(microseconds=1)
+    return datetime.datetime(year + 1, 2, 1), datetime.datetime(year + 1, 9, 1) - datetime.timedelta(microseconds=1)
+
+
+def insort_unique(entries, entry):
+    i = bisect.bisect_left(entries, entry)
+    if i == len(entries) or entries[i] != entry:
+        entries.insert(i, entry)
+
+
+class DateIndex:
+    # Отсортированные ординалы дат предмета с исходными ключами "ДД.ММ.ГГГГ":
+    # выборка по диапазону - это bisect, порядок - хронологический
+    def __init__(self):
+        self.entries = []
+        self.by_type = {}
+
+    def add(self, date_str, class_types):
+        try:
+            ordinal = parse_date(date_str).toordinal()
+        except ValueError:
+            return
+        entry = (ordinal, date_str)
+        insort_unique(self.entries, entry)
+        for class_type in class_types:
+            insort_unique(self.by_type.setdefault(class_type, []), entry)
+
+    def range(self, start_date, end_date, class_type=None):
+        # Ключи дат с start_date <= дата <= end_date, опционально только с данным типом занятия
+        entries = self.entries if class_type is None else self.by_type.get(class_type, [])
+        lo = bisect.bisect_left(entries, (start_date.toordinal(),))
+        hi = bisect.bisect_left(entries, (end_date.toordinal() + 1,))
+        return [date_str for _, date_str in entries[lo:hi]]
+
+
+def apply_session(data, date, class_type, marks, confirmed):
+    # confirmed=None (частичный импорт без флага) не меняет подтверждение занятия
+    session = data.setdefault(date, {}).setdefault(class_type, {})
+    session.update(marks)
+    if confirmed is None:
+        session.setdefault("confirmed", False)
+    else:
+        session["confirmed"] = confirmed
+
+
+def lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK сдается после 10 попыток, ждем дальше
+            continue
+
+
+def unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def merge_manifest(target, source):
+    # Шарды, которые добавил другой процесс; имена файлов детерминированы, конфликтов нет
+    for subject, semesters in source["shards"].items():
+        subject_shards = target["shards"].setdefault(subject, {})
+        for semester, filename in semesters.items():
+            subject_shards.setdefault(semester, filename)
+
+
+def append_journal(path, text):
+    with open(path, "a+b") as f:
+        # Оборванная при сбое последняя строка отделяется, чтобы не склеиться с новой записью
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                text = "\n" + text
+        f.write(text.encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def file_state(path):
+    # (время изменения, размер) файла или None, если его нет
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def snapshot(dates):
+    # Копия дат до уровня занятий: отчет в фоновом потоке обходит ее, пока окно явки дописывает шарды
+    return {date: {class_type: dict(session) for class_type, session in types.items()}
+            for date, types in dates.items()}
+
+
+def write_atomic(path, text):
+    # Атомарная замена: оборванная запись не портит существующий файл
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class AttendanceStore:
+    # Хранилище явки, разбитое на шарды "предмет/семестр" с манифестом.
+    # Шард читается при первом обращении, сохранение дописывает запись
+    # в журнал шарда, а фоновое сворачивание переписывает только шарды,
+    # у которых есть несвернутые записи. Чтение и запись на диске идут под
+    # блокировкой каталога, поэтому с одним каталогом могут работать несколько
+    # процессов; загруженный шард перечитывается, если его файлы изменил другой процесс.
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.lock = threading.RLock()
+        self.lock_depth = 0
+        self.compaction_thread = None
+        self.shards = {}
+        self.indexes = {}
+        self.journal_records = {}
+        # Состояние снимка и журнала шарда на момент загрузки: (снимок, журнал)
+        self.shard_states = {}
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.lock_handle = open(os.path.join(self.data_dir, LOCK_FILE), "a+")
+        with self.exclusive():
+            self.manifest_mtime, self.manifest = self.read_manifest()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        # Потоки этого процесса - через self.lock, другие процессы - через файл блокировки
+        with self.lock:
+            self.lock_depth += 1
+            try:
+                if self.lock_depth == 1:
+                    lock_file(self.lock_handle)
+                try:
+                    yield
+                finally:
+                    if self.lock_depth == 1:
+                        unlock_file(self.lock_handle)
+            finally:
+                self.lock_depth -= 1
+
+    def manifest_path(self):
+        return os.path.join(self.data_dir, MANIFEST_FILE)
+
+    def read_manifest(self):
+        try:
+            mtime = os.stat(self.manifest_path()).st_mtime_ns
+            with open(self.manifest_path(), "r", encoding="utf-8") as f:
+                return mtime, json.load(f)
+        except FileNotFoundError:
+            return None, {"version": 1, "shards": {}}
+
+    def refresh_manifest(self):
+        # Манифест перечитывается, только если его переписал другой процесс
+        with self.exclusive():
+            try:
+                mtime = os.stat(self.manifest_path()).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime != self.manifest_mtime:
+                self.manifest_mtime, manifest = self.read_manifest()
+                merge_manifest(self.manifest, manifest)
+
+    @staticmethod
+    def shard_filename(subject, semester):
+        digest = hashlib.sha1(subject.encode("utf-8")).hexdigest()[:12]
+        return f"{digest}_{semester}.json"
+
+    def shard_path(self, subject, semester):
+        return os.path.join(self.data_dir, self.manifest["shards"][subject][semester])
+
+    def semesters(self, subject):
+        self.refresh_manifest()
+        return list(self.manifest["shards"].get(subject, {}))
+
+    @staticmethod
+    def shard_state(path):
+        return file_state(path), file_state(path + ".journal")
+
+    def read_shard(self, path):
+        # Снимок и журналы шарда с диска: (данные, число записей журналов)
+        data = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        # .journal.compacting остается от прежнего способа сворачивания, затем текущий журнал
+        count = 0
+        for journal in (path + ".journal.compacting", path + ".journal"):
+            count += self.replay_journal(journal, data)
+        return data, count
+
+    def load_shard(self, subject, semester):
+        # Снимок и журнал читаются под блокировкой каталога: иначе между ними может пройти
+        # чужое сворачивание, а в Windows открытый файл мешает другому процессу его заменить
+        with self.exclusive():
+            key = (subject, semester)
+            if semester not in self.manifest["shards"].get(subject, {}):
+                # Шарда еще нет: не кэшируется, чтобы потом увидеть созданный другим процессом
+                return {}
+            path = self.shard_path(subject, semester)
+            state = self.shard_state(path)
+            if key in self.shards and self.shard_states[key] == state:
+                return self.shards[key]
+            # Первое обращение или файлы шарда изменил другой процесс (импорт, пакетная работа).
+            # Словарь шарда обновляется на месте: его уже могли получить вызывающие
+            data, self.journal_records[key] = self.read_shard(path)
+            self.shard_states[key] = state
+            shard = self.shards.setdefault(key, {})
+            shard.clear()
+            shard.update(data)
+            index = self.indexes.setdefault(subject, DateIndex())
+            for date, types in data.items():
+                index.add(date, types)
+            return shard
+
+    def replay_journal(self, path, data):
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Строка, оборванная сбоем при записи
+                    continue
+                apply_session(data, record["date"], record["class_type"], record["marks"], record["confirmed"])
+                count += 1
+        return count
+
+    def subject_data(self, subject, start_date=None, end_date=None):
+        # Снимок дат предмета из шардов, пересекающих диапазон (без диапазона - все)
+        result = {}
+        with self.lock:
+            for semester in self.semesters(subject):
+                if start_date is not None and end_date is not None:
+                    if semester == UNKNOWN_SEMESTER:
+                        continue
+                    first, last = semester_bounds(semester)
+                    if last < start_date or first > end_date:
+                        continue
+                result.update(snapshot(self.load_shard(subject, semester)))
+        return result
+
+    def date_index(self, subject):
+        # Покрывает уже загруженные шарды предмета (см. subject_data)
+        return self.indexes.get(subject, DateIndex())
+
+    def ensure_shard(self, subject, semester):
+        # Новый шард сразу попадает в манифест, чтобы его журнал нашелся после сбоя
+        with self.exclusive():
+            self.refresh_manifest()
+            subject_shards = self.manifest["shards"].setdefault(subject, {})
+            if semester not in subject_shards:
+                subject_shards[semester] = self.shard_filename(subject, semester)
+                self.save_manifest()
+            return self.load_shard(subject, semester)
+
+    def save_manifest(self):
+        # Перед записью манифест сливается с версией на диске: ее мог дописать другой процесс
+        with self.exclusive():
+            _, manifest = self.read_manifest()
+            merge_manifest(self.manifest, manifest)
+            write_atomic(self.manifest_path(), json.dumps(self.manifest, ensure_ascii=False, indent=4))
+            self.manifest_mtime = os.stat(self.manifest_path()).st_mtime_ns
+
+    def record_session(self, subject, date, class_type, marks, confirmed):
+        with span("save.record_session", subject=subject, students=len(marks)):
+            self.append_sessions([(subject, date, class_type, marks, confirmed)])
+
+    def record_sessions(self, sessions):
+        # Пакетная запись (импорт): журнал каждого шарда дописывается и синхронизируется один раз
+        with span("save.record_sessions", sessions=len(sessions)):
+            self.append_sessions(sessions)
+
+    def append_sessions(self, sessions):
+        by_shard = {}
+        for subject, date, class_type, marks, confirmed in sessions:
+            by_shard.setdefault((subject, semester_of(date)), []).append((date, class_type, marks, confirmed))
+        with self.exclusive():
+            for key, shard_sessions in by_shard.items():
+                subject, semester = key
+                data = self.ensure_shard(subject, semester)
+                lines = []
+                for date, class_type, marks, confirmed in shard_sessions:
+                    record = {"date": date, "class_type": class_type, "marks": marks, "confirmed": confirmed}
+                    lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                # Память меняется только после записи журнала: иначе при ошибке диска
+                # отчеты показали бы отметки, которых после перезапуска нет
+                path = self.shard_path(subject, semester)
+                append_journal(path + ".journal", "".join(lines))
+                self.shard_states[key] = self.shard_state(path)
+                self.journal_records[key] = self.journal_records.get(key, 0) + len(lines)
+                for date, class_type, marks, confirmed in shard_sessions:
+                    apply_session(data, date, class_type, marks, confirmed)
+                    self.indexes[subject].add(date, [class_type])
+            pending = sum(self.journal_records.values())
+        if pending >= COMPACT_THRESHOLD:
+            self.start_compaction()
+
+    def start_compaction(self):
+        if self.compaction_thread and self.compaction_thread.is_alive():
+            return
+        self.compaction_thread = threading.Thread(target=self.compact, daemon=True)
+        self.compaction_thread.start()
+
+    def compact(self):
+        with span("save.compact"):
+            self.compact_shards()
+
+    def compact_shards(self):
+        with self.lock:
+            keys = [key for key, count in self.journal_records.items() if count]
+        for key in keys:
+            # По шарду за раз, чтобы сохранения не ждали сворачивания всех шардов
+            with self.exclusive():
+                # Снимок собирается заново с диска: в журнале могут быть записи других процессов.
+                # Сбой между записью снимка и удалением журнала безопасен - повтор записей идемпотентен
+                path = self.shard_path(*key)
+                data, _ = self.read_shard(path)
+                write_atomic(path, json.dumps(data, ensure_ascii=False, indent=4))
+                for journal in (path + ".journal.compacting", path + ".journal"):
+                    if os.path.exists(journal):
+                        os.remove(journal)
+                shard = self.shards[key]
+                shard.clear()
+                shard.update(data)
+                for date, types in data.items():
+                    self.indexes[key[0]].add(date, types)
+                self.shard_states[key] = self.shard_state(path)
+                self.journal_records[key] = 0
+
+    def flush(self):
+        if self.compaction_thread and self.compaction_thread.is_alive():
+            self.compaction_thread.join()
+        self.compact()
+
+    def migrate_legacy(self, data_file=LEGACY_DATA_FILE, journal_file=LEGACY_JOURNAL_FILE):
+        # Перенос из единого attendance_data.json в шарды. Пока старые файлы не переименованы,
+        # перенос считается незавершенным и повторяется: сначала пишутся все шарды, последним -
+        # манифест (точка фиксации), после него старые файлы переименовываются
+        legacy_files = (data_file, journal_file + ".compacting", journal_file)
+        if not any(os.path.exists(path) for path in legacy_files):
+            return False
+        with self.exclusive():
+            # Другой процесс мог завершить перенос, пока мы ждали блокировку
+            if not any(os.path.exists(path) for path in legacy_files):
+                return False
+            data = {}
+            if os.path.exists(data_file):
+                with open(data_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            for path in legacy_files[1:]:
+                if not os.path.exists(path):
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        apply_session(data.setdefault(record["subject"], {}), record["date"], record["class_type"],
+                                      record["marks"], record["confirmed"])
+            shards = {}
+            for subject, dates in data.items():
+                for date, types in dates.items():
+                    shards.setdefault((subject, semester_of(date)), {})[date] = types
+            self.refresh_manifest()
+            for (subject, semester), shard in shards.items():
+                existing = self.manifest["shards"].get(subject, {}).get(semester)
+                if existing:
+                    # Шард уже есть (повтор после сбоя или записи после него): его занятия новее
+                    for date, types in self.read_shard(os.path.join(self.data_dir, existing))[0].items():
+                        shard.setdefault(date, {}).update(types)
+                filename = existing or self.shard_filename(subject, semester)
+                write_atomic(os.path.join(self.data_dir, filename), json.dumps(shard, ensure_ascii=False, indent=4))
+            for subject, semester in shards:
+                self.manifest["shards"].setdefault(subject, {}).setdefault(semester, self.shard_filename(subject, semester))
+            self.save_manifest()
+            self.shards.clear()
+            self.indexes.clear()
+            self.journal_records.clear()
+            self.shard_states.clear()
+            # Старые файлы сохраняются как резервная копия
+            for path in legacy_files:
+                if os.path.exists(path):
+                    os.replace(path, path + ".migrated")
+        return True
@@ -0,0 +1,40 @@
+import datetime
+from export import iter_tables
+from report import ReportGenerator
+from storage import AttendanceStore, ConfigIndex
+
+SUBJECTS = {
+    "A": {"lectures": True, "practices": False, "labs": {"1": ["Петров"]}, "students": ["Петров", "Иванов"]},
+    "B": {"lectures": True, "practices": False, "labs": {}, "students": ["Сидоров"]},
+}
+START, END = datetime.datetime(2024, 9, 1), datetime.datetime(2024, 12, 31)
+
+
+def make_generator(tmp_path):
+    store = AttendanceStore(str(tmp_path))
+    store.record_sessions([("A", "01.10.2024", "Лекция", {"Иванов": "есть", "Петров": "н"}, True),
+                           ("A", "02.10.2024", "Лабораторная работа - 1", {"Петров": "есть"}, False),
+                           ("B", "03.10.2024", "Лекция", {"Сидоров": "б"}, True)])
+    return ReportGenerator(ConfigIndex(SUBJECTS), store)
+
+
+def test_export_rows_match_report_tables(tmp_path):
+    generator = make_generator(tmp_path)
+    sheets = [(layout["title"], list(rows)) for layout, rows in iter_tables(generator, ["A"], START, END)]
+    assert sheets == [
+        ("A", [["ФИО студента", "01.10.2024"], ["Тип занятия", "Лекция"], ["Иванов", "есть"], ["Петров", "н"],
+               ["Подтверждено", "да"]]),
+        ("A - Лабораторная работа - 1", [["ФИО студента", "02.10.2024"], ["Тип занятия", "Лабораторная работа - 1"],
+                                         ["Петров", "есть"], ["Подтверждено", "нет"]]),
+    ]
+
+
+def test_config_reload_does_not_mix_versions(tmp_path):
+    generator = make_generator(tmp_path)
+    titles = []
+    for layout, rows in iter_tables(generator, ["A", "B"], START, END):
+        list(rows)
+        titles.append(layout["title"])
+        # Перезагрузка config.json посреди выгрузки: предмет B удален
+        generator.config = ConfigIndex({"A": SUBJECTS["A"]})
+    assert titles == ["A", "A - Лабораторная работа - 1", "B"]
@@ -0,0 +1,67 @@
+import csv
+import io
+from importer import Importer, read_rows
+from storage import AttendanceStore
+
+SUBJECTS = {"S": {"lectures": True, "practices": False, "labs": {}, "students": ["Иванов", "Петров"]}}
+
+
+def write_csv(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_malformed_rows_go_to_error_report(tmp_path):
+    path = write_csv(tmp_path / "m.csv", "предмет;дата;тип занятия;студент;отметка\n"
+                                         "S;01.10.2024;Лекция;Иванов;есть;extra\n"
+                                         "S;01.10.2024;Лекция\n"
+                                         "S;01.10.2024;Лекция;Петров;н\n")
+    report = io.StringIO()
+    importer = Importer(SUBJECTS, None, dry_run=True, errors=csv.writer(report, delimiter=";"))
+    stats = importer.import_marks(read_rows(path))
+    assert stats["errors"] == 2 and stats["marks"] == 1
+    lines = report.getvalue().splitlines()
+    assert lines[0].startswith("2;") and lines[0].endswith(";extra")
+    assert lines[1].startswith("3;")
+
+
+def test_short_access_log_rows_are_errors(tmp_path):
+    path = write_csv(tmp_path / "a.csv", "time;student\n01.10.2024 09:00;Иванов\n01.10.2024 09:05\n")
+    importer = Importer(SUBJECTS, None, dry_run=True)
+    stats = importer.import_access_log(read_rows(path), "S", "Лекция", ["01.10.2024"], "time", "student")
+    assert stats["errors"] == 1 and stats["sessions"] == 1
+
+
+def test_access_log_creates_only_given_sessions(tmp_path):
+    # Проходы за месяц, а лекция была только 08.10 (и 15.10, когда никто не прошел)
+    passes = "".join(f"{day:02d}.10.2024 09:00;Иванов\n" for day in range(1, 31))
+    path = write_csv(tmp_path / "a.csv", "time;student\n" + passes + "08.10.2024 09:10;Петров\n")
+    store = AttendanceStore(str(tmp_path / "data"))
+    stats = Importer(SUBJECTS, store).import_access_log(read_rows(path), "S", "Лекция",
+                                                        ["08.10.2024", "15.10.2024"], "time", "student")
+    assert stats["sessions"] == 2 and stats["errors"] == 0
+    data = AttendanceStore(str(tmp_path / "data")).subject_data("S")
+    assert data == {"08.10.2024": {"Лекция": {"Иванов": "есть", "Петров": "есть", "confirmed": False}},
+                    "15.10.2024": {"Лекция": {"Иванов": "есть", "Петров": "н", "confirmed": False}}}
+
+
+def test_partial_import_keeps_confirmed_flag(tmp_path):
+    store = AttendanceStore(str(tmp_path / "data"))
+    store.record_session("S", "01.10.2024", "Лекция", {"Иванов": "есть", "Петров": "есть"}, True)
+    path = write_csv(tmp_path / "m.csv", "предмет;дата;тип занятия;студент;отметка\n"
+                                         "S;01.10.2024;Лекция;Петров;б\n")
+    Importer(SUBJECTS, store).import_marks(read_rows(path))
+    session = AttendanceStore(str(tmp_path / "data")).subject_data("S")["01.10.2024"]["Лекция"]
+    assert session == {"Иванов": "есть", "Петров": "б", "confirmed": True}
+
+
+def test_explicit_flag_survives_later_batches(tmp_path):
+    store = AttendanceStore(str(tmp_path / "data"))
+    path = write_csv(tmp_path / "m.csv", "предмет;дата;тип занятия;студент;отметка;подтверждено\n"
+                                         "S;01.10.2024;Лекция;Иванов;есть;да\n"
+                                         "S;08.10.2024;Лекция;Иванов;н;\n"
+                                         "S;01.10.2024;Лекция;Петров;н;\n")
+    Importer(SUBJECTS, store, batch_size=1).import_marks(read_rows(path))
+    data = AttendanceStore(str(tmp_path / "data")).subject_data("S")
+    assert data["01.10.2024"]["Лекция"]["confirmed"] is True
+    assert data["08.10.2024"]["Лекция"]["confirmed"] is False
@@ -0,0 +1,30 @@
+import datetime
+import os
+from report import generate_reports, report_filename
+from storage import AttendanceStore
+
+SUBJECTS = {
+    "A": {"lectures": True, "practices": False, "labs": {}, "students": ["Иванов"]},
+    "B": {"lectures": True, "practices": False, "labs": {}, "students": ["Петров"]},
+}
+START, END = datetime.datetime(2024, 9, 1), datetime.datetime(2024, 12, 31)
+
+
+def test_report_filenames_do_not_collide():
+    names = {report_filename(subject, START, END) for subject in ("A: B", "A B", "A_B")}
+    assert len(names) == 3
+    assert report_filename("A_B", START, END) == "attendance_report_A_B_20240901-20241231.pdf"
+
+
+def test_failed_subject_does_not_abort_batch(tmp_path):
+    data_dir = str(tmp_path / "data")
+    store = AttendanceStore(data_dir)
+    store.record_sessions([("A", "01.10.2024", "Лекция", {"Иванов": "есть"}, True),
+                           ("B", "01.10.2024", "Лекция", {"Петров": "н"}, True)])
+    store.flush()
+    # Испорченный снимок шарда предмета B
+    with open(store.shard_path("B", "2024-1"), "w", encoding="utf-8") as f:
+        f.write("{")
+    results, failures = generate_reports(SUBJECTS, START, END, data_dir, str(tmp_path / "reports"), jobs=1)
+    assert list(results) == ["A"] and os.path.exists(results["A"])
+    assert list(failures) == ["B"]
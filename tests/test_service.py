@@ -0,0 +1,136 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import pytest
+import service
+from service import AttendanceServer, RemoteStore
+from storage import AttendanceStore
+
+
+class RunningServer:
+    # Сервис в отдельном потоке со своим циклом событий
+    def __init__(self, data_dir, port=0, store=None, batch_delay=0.01):
+        self.server = AttendanceServer(store or AttendanceStore(data_dir), port=port, batch_delay=batch_delay)
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.server.start())
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+        self.port = self.server.port
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("не дождались")
+        time.sleep(0.02)
+
+
+def test_concurrent_clients_do_not_lose_marks(tmp_path):
+    running = RunningServer(str(tmp_path))
+    try:
+        clients = [RemoteStore(port=running.port) for _ in range(8)]
+
+        def work(number):
+            for _ in range(5):
+                clients[number].record_session("S", "01.10.2024", "Лекция", {f"студент{number}": "есть"}, True)
+
+        threads = [threading.Thread(target=work, args=(number,)) for number in range(len(clients))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reader = RemoteStore(port=running.port)
+        assert len(reader.subject_data("S")["01.10.2024"]["Лекция"]) == len(clients) + 1
+    finally:
+        running.stop()
+    assert len(AttendanceStore(str(tmp_path)).subject_data("S")["01.10.2024"]["Лекция"]) == 9
+
+
+def test_client_recovers_after_service_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(service, "RECONNECT_DELAY", 0.05)
+    running = RunningServer(str(tmp_path))
+    port = running.port
+    client = RemoteStore(port=port)
+    client.record_session("S", "01.10.2024", "Лекция", {"Иванов": "есть"}, True)
+    assert client.subject_data("S")
+    running.stop()
+    # Пока сервиса нет, сохранение завершается ошибкой, а кэш сбрасывается
+    with pytest.raises(OSError):
+        client.record_session("S", "01.10.2024", "Лекция", {"Петров": "н"}, True)
+    wait_for(lambda: not client.subjects)
+
+    running = RunningServer(str(tmp_path), port)
+    try:
+        client.record_session("S", "08.10.2024", "Лекция", {"Петров": "н"}, True)
+        assert set(client.subject_data("S")) == {"01.10.2024", "08.10.2024"}
+        # Подписка восстановлена: запись другого клиента сбрасывает кэш предмета
+        RemoteStore(port=port).record_session("S", "15.10.2024", "Лекция", {"Иванов": "б"}, True)
+        wait_for(lambda: "15.10.2024" in client.subject_data("S"))
+    finally:
+        running.stop()
+
+
+def raw_request(port, message):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as connection:
+        connection.sendall((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+        return json.loads(connection.makefile("r", encoding="utf-8").readline())
+
+
+def test_invalid_submit_does_not_fail_batch(tmp_path):
+    running = RunningServer(str(tmp_path), batch_delay=0.2)
+    try:
+        client = RemoteStore(port=running.port)
+        bad = [{"op": "submit", "subject": "S", "date": "01.10.2024", "class_type": "Лекция", "marks": ["x"]},
+               {"op": "submit", "subject": "S", "date": "2024-10-01", "class_type": "Лекция", "marks": {}},
+               {"op": "submit", "subject": "S", "date": "01.10.2024", "class_type": "Лекция", "marks": {"Иванов": "x"}},
+               {"op": "submit", "subject": 1, "date": "01.10.2024", "class_type": "Лекция", "marks": {}}]
+        responses = []
+        threads = [threading.Thread(target=lambda message=message: responses.append(raw_request(running.port, message)))
+                   for message in bad]
+        for thread in threads:
+            thread.start()
+        # Верная заявка в том же окне пакета
+        client.record_session("S", "01.10.2024", "Лекция", {"Петров": "есть"}, True)
+        for thread in threads:
+            thread.join()
+        assert len(responses) == len(bad) and not any(response["ok"] for response in responses)
+    finally:
+        running.stop()
+    assert AttendanceStore(str(tmp_path)).subject_data("S") == {
+        "01.10.2024": {"Лекция": {"Петров": "есть", "confirmed": True}}}
+
+
+def test_failed_batch_is_retried_per_session(tmp_path):
+    class FailingBatchStore(AttendanceStore):
+        def record_sessions(self, sessions):
+            raise OSError("пакет не записан")
+
+    running = RunningServer(str(tmp_path), store=FailingBatchStore(str(tmp_path)), batch_delay=0.1)
+    try:
+        clients = [RemoteStore(port=running.port) for _ in range(3)]
+        threads = [threading.Thread(target=client.record_session,
+                                    args=("S", "01.10.2024", "Лекция", {f"студент{number}": "есть"}, True))
+                   for number, client in enumerate(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(RemoteStore(port=running.port).subject_data("S")["01.10.2024"]["Лекция"]) == 4
+    finally:
+        running.stop()
@@ -0,0 +1,47 @@
+from stats import ABSENT, EXCUSED, PRESENT, AttendanceMatrix, subject_summary
+from storage import ConfigIndex
+
+SUBJECT = {"lectures": True, "practices": False, "labs": {"1": ["Иванов"], "2": ["Петров", "Сидоров"]},
+           "students": ["Сидоров", "Иванов", "Петров"]}
+ATTENDANCE = {
+    "01.10.2024": {"Лекция": {"Иванов": "есть", "Петров": "н", "confirmed": True},
+                   "Лабораторная работа - 2": {"Петров": "есть", "Сидоров": "б", "confirmed": False}},
+    "08.10.2024": {"Лекция": {"Иванов": "есть", "Петров": "есть", "confirmed": False}},
+}
+LECTURES = [("01.10.2024", "Лекция"), ("08.10.2024", "Лекция")]
+
+
+def test_matrix_codes_and_percentages():
+    config = ConfigIndex({"S": SUBJECT})
+    matrix = AttendanceMatrix.from_attendance(config.roster("S", "Лекция"), ATTENDANCE, LECTURES)
+    assert matrix.students == ("Иванов", "Петров", "Сидоров")
+    assert bytes(matrix.row(0)) == bytes([PRESENT, PRESENT])
+    assert bytes(matrix.row(1)) == bytes([ABSENT, PRESENT])
+    assert list(matrix.confirmed) == [1, 0]
+    # У Сидорова на лекциях нет отметок: процента нет, в список отстающих он не попадает
+    assert matrix.student_percentages() == [100.0, 50.0, None]
+    assert matrix.session_percentages() == [50.0, 100.0]
+    assert matrix.below_threshold() == [("Петров", 50.0)]
+    assert matrix.type_totals() == {"Лекция": [3, 1, 0]}
+
+
+def test_summary_merges_lab_subgroup():
+    config = ConfigIndex({"S": SUBJECT})
+    lab = "Лабораторная работа - 2"
+    assert config.roster("S", lab) == ("Петров", "Сидоров")
+    lectures = AttendanceMatrix.from_attendance(config.roster("S", "Лекция"), ATTENDANCE, LECTURES)
+    labs = AttendanceMatrix.from_attendance(config.roster("S", lab), ATTENDANCE, [("01.10.2024", lab)])
+    assert bytes(labs.column(0)) == bytes([PRESENT, EXCUSED])
+
+    summary = subject_summary([lectures, labs])
+    assert summary["students"] == [("Иванов", 100.0, 0, 0), ("Петров", 66.7, 1, 0), ("Сидоров", 0.0, 0, 1)]
+    assert summary["types"] == {"Лекция": 75.0, lab: 50.0}
+    assert summary["below"] == [("Петров", 66.7), ("Сидоров", 0.0)]
+    assert summary["worst_sessions"] == [(50.0, ("01.10.2024", lab)), (50.0, ("01.10.2024", "Лекция")),
+                                         (100.0, ("08.10.2024", "Лекция"))]
+
+
+def test_summary_of_empty_subject():
+    summary = subject_summary([AttendanceMatrix.from_attendance(["Иванов"], {}, [])])
+    assert summary["students"] == [("Иванов", None, 0, 0)]
+    assert summary["below"] == [] and summary["types"] == {}
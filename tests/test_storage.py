@@ -0,0 +1,224 @@
+import json
+import os
+import pytest
+import storage
+from storage import AttendanceStore, LEGACY_DATA_FILE, LEGACY_JOURNAL_FILE
+
+LEGACY = {
+    "S": {
+        "01.10.2024": {"Лекция": {"Иванов": "есть", "Петров": "н", "confirmed": True}},
+        "03.03.2025": {"Лекция": {"Иванов": "б", "Петров": "есть", "confirmed": False}},
+    },
+    "T": {"02.10.2024": {"Практика": {"Иванов": "н", "confirmed": True}}},
+}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open(LEGACY_DATA_FILE, "w", encoding="utf-8") as f:
+        json.dump(LEGACY, f, ensure_ascii=False)
+    return tmp_path
+
+
+def data_dir(workdir):
+    return str(workdir / "data")
+
+
+def test_migration_moves_legacy_data(workdir):
+    store = AttendanceStore(data_dir(workdir))
+    assert store.migrate_legacy()
+    assert not os.path.exists(LEGACY_DATA_FILE)
+    assert os.path.exists(LEGACY_DATA_FILE + ".migrated")
+
+    reopened = AttendanceStore(data_dir(workdir))
+    assert not reopened.migrate_legacy()
+    assert reopened.subject_data("S") == LEGACY["S"]
+    assert reopened.subject_data("T") == LEGACY["T"]
+
+
+def test_migration_includes_legacy_journal(workdir):
+    record = {"subject": "S", "date": "01.10.2024", "class_type": "Лекция",
+              "marks": {"Петров": "б"}, "confirmed": True}
+    with open(LEGACY_JOURNAL_FILE, "w", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n" + '{"subject": "S", "da')
+    store = AttendanceStore(data_dir(workdir))
+    assert store.migrate_legacy()
+    assert store.subject_data("S")["01.10.2024"]["Лекция"]["Петров"] == "б"
+    assert not os.path.exists(LEGACY_JOURNAL_FILE)
+
+
+def test_migration_crash_on_shard_write_is_retried(workdir, monkeypatch):
+    write_atomic = storage.write_atomic
+
+    def failing_write(path, text):
+        if not path.endswith(storage.MANIFEST_FILE):
+            raise OSError("диск заполнен")
+        write_atomic(path, text)
+
+    monkeypatch.setattr(storage, "write_atomic", failing_write)
+    with pytest.raises(OSError):
+        AttendanceStore(data_dir(workdir)).migrate_legacy()
+    monkeypatch.setattr(storage, "write_atomic", write_atomic)
+
+    # Манифест - точка фиксации: без него и со старым файлом на месте перенос повторяется
+    assert not os.path.exists(os.path.join(data_dir(workdir), storage.MANIFEST_FILE))
+    assert os.path.exists(LEGACY_DATA_FILE)
+    store = AttendanceStore(data_dir(workdir))
+    assert store.migrate_legacy()
+    assert store.subject_data("S") == LEGACY["S"]
+
+
+def test_migration_crash_before_rename_keeps_newer_records(workdir, monkeypatch):
+    replace = os.replace
+
+    def failing_replace(src, dst):
+        if dst.endswith(".migrated"):
+            raise OSError("файл занят")
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        AttendanceStore(data_dir(workdir)).migrate_legacy()
+    monkeypatch.setattr(os, "replace", replace)
+
+    # Записи, сделанные до повторного переноса, не затираются старым файлом
+    store = AttendanceStore(data_dir(workdir))
+    store.record_session("S", "01.10.2024", "Лекция", {"Петров": "б"}, True)
+    assert AttendanceStore(data_dir(workdir)).migrate_legacy()
+    reopened = AttendanceStore(data_dir(workdir))
+    assert reopened.subject_data("S")["01.10.2024"]["Лекция"]["Петров"] == "б"
+    assert reopened.subject_data("S")["03.03.2025"] == LEGACY["S"]["03.03.2025"]
+    assert not os.path.exists(LEGACY_DATA_FILE)
+
+
+def test_journal_replay_skips_torn_line(tmp_path):
+    store = AttendanceStore(str(tmp_path))
+    store.record_session("S", "01.10.2024", "Лекция", {"Иванов": "есть"}, False)
+    path = store.shard_path("S", "2024-1") + ".journal"
+    # Сбой посреди записи оставил оборванную строку, после нее дописана новая запись
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"date": "01.10.2024", "class_t')
+    store.record_session("S", "08.10.2024", "Лекция", {"Иванов": "н"}, True)
+
+    reopened = AttendanceStore(str(tmp_path))
+    data = reopened.subject_data("S")
+    assert data["01.10.2024"]["Лекция"] == {"Иванов": "есть", "confirmed": False}
+    assert data["08.10.2024"]["Лекция"] == {"Иванов": "н", "confirmed": True}
+    assert reopened.journal_records[("S", "2024-1")] == 2
+
+
+def test_compaction_writes_snapshot_and_removes_journal(tmp_path):
+    store = AttendanceStore(str(tmp_path))
+    store.record_session("S", "01.10.2024", "Лекция", {"Иванов": "есть"}, True)
+    store.record_session("S", "03.03.2025", "Лекция", {"Иванов": "н"}, False)
+    store.flush()
+    path = store.shard_path("S", "2024-1")
+    assert not os.path.exists(path + ".journal")
+    with open(path, "r", encoding="utf-8") as f:
+        assert json.load(f) == {"01.10.2024": {"Лекция": {"Иванов": "есть", "confirmed": True}}}
+    assert AttendanceStore(str(tmp_path)).subject_data("S") == store.subject_data("S")
+
+
+def test_crash_during_compaction_replays_leftover_journals(tmp_path):
+    store = AttendanceStore(str(tmp_path))
+    store.record_session("S", "01.10.2024", "Лекция", {"Иванов": "есть"}, True)
+    path = store.shard_path("S", "2024-1")
+    # Журнал, переименованный прежней версией сворачивания, и новый журнал после него
+    os.replace(path + ".journal", path + ".journal.compacting")
+    store.record_session("S", "01.10.2024", "Лекция", {"Иванов": "н"}, True)
+
+    reopened = AttendanceStore(str(tmp_path))
+    assert reopened.subject_data("S")["01.10.2024"]["Лекция"]["Иванов"] == "н"
+    reopened.flush()
+    assert not os.path.exists(path + ".journal.compacting")
+    assert AttendanceStore(str(tmp_path)).subject_data("S")["01.10.2024"]["Лекция"]["Иванов"] == "н"
+
+
+def test_second_store_shards_survive_manifest_rewrite(tmp_path):
+    app_store = AttendanceStore(str(tmp_path))
+    app_store.record_session("B", "01.10.2024", "Лекция", {"Иванов": "есть"}, True)
+    # Импорт работает с тем же каталогом, пока приложение открыто
+    AttendanceStore(str(tmp_path)).record_sessions([("A", "01.10.2024", "Лекция", {"Петров": "н"}, True)])
+    app_store.record_session("C", "01.10.2024", "Лекция", {"Иванов": "б"}, True)
+
+    reopened = AttendanceStore(str(tmp_path))
+    assert reopened.subject_data("A")["01.10.2024"]["Лекция"]["Петров"] == "н"
+    assert app_store.subject_data("A")["01.10.2024"]["Лекция"]["Петров"] == "н"
+
+
+def test_compaction_keeps_records_of_other_processes(tmp_path):
+    app_store = AttendanceStore(str(tmp_path))
+    app_store.record_session("S", "01.10.2024", "Лекция", {"Иванов": "есть"}, True)
+    AttendanceStore(str(tmp_path)).record_session("S", "08.10.2024", "Лекция", {"Петров": "н"}, False)
+    app_store.record_session("S", "15.10.2024", "Лекция", {"Иванов": "б"}, True)
+    app_store.flush()
+
+    data = AttendanceStore(str(tmp_path)).subject_data("S")
+    assert set(data) == {"01.10.2024", "08.10.2024", "15.10.2024"}
+    # Сворачивание подтягивает чужие записи и в память
+    assert "08.10.2024" in app_store.subject_data("S")
+
+
+def test_subject_data_is_a_snapshot(tmp_path):
+    store = AttendanceStore(str(tmp_path))
+    store.record_session("S", "01.10.2024", "Лекция", {"Иванов": "есть"}, True)
+    data = store.subject_data("S")
+    # Сохранение из окна явки, пока отчет обходит полученные данные
+    store.record_session("S", "01.10.2024", "Практика", {"Иванов": "н"}, False)
+    store.record_session("S", "01.10.2024", "Лекция", {"Петров": "б"}, True)
+    assert data == {"01.10.2024": {"Лекция": {"Иванов": "есть", "confirmed": True}}}
+
+
+def test_failed_journal_write_leaves_memory_unchanged(tmp_path, monkeypatch):
+    store = AttendanceStore(str(tmp_path))
+    store.record_session("S", "01.10.2024", "Лекция", {"Иванов": "есть"}, True)
+
+    def failing_append(path, text):
+        raise OSError("диск заполнен")
+
+    monkeypatch.setattr(storage, "append_journal", failing_append)
+    with pytest.raises(OSError):
+        store.record_session("S", "08.10.2024", "Лекция", {"Иванов": "н"}, True)
+    assert set(store.subject_data("S")) == {"01.10.2024"}
+    assert store.date_index("S").entries == [(storage.parse_date("01.10.2024").toordinal(), "01.10.2024")]
+
+
+def test_loaded_shard_sees_records_of_other_processes(tmp_path):
+    app_store = AttendanceStore(str(tmp_path))
+    app_store.record_session("S", "01.10.2024", "Лекция", {"Иванов": "есть"}, True)
+    shard = app_store.load_shard("S", "2024-1")
+    # Импорт дописывает журнал, затем другой процесс сворачивает шард
+    importer = AttendanceStore(str(tmp_path))
+    importer.record_session("S", "08.10.2024", "Лекция", {"Петров": "н"}, False)
+    assert "08.10.2024" in app_store.subject_data("S")
+    importer.record_session("S", "15.10.2024", "Лекция", {"Петров": "б"}, True)
+    importer.flush()
+    assert set(app_store.subject_data("S")) == {"01.10.2024", "08.10.2024", "15.10.2024"}
+    assert app_store.load_shard("S", "2024-1") is shard
+    assert app_store.date_index("S").range(storage.parse_date("01.10.2024"), storage.parse_date("31.10.2024")) == [
+        "01.10.2024", "08.10.2024", "15.10.2024"]
+
+
+def test_date_index_orders_dates_across_months():
+    index = storage.DateIndex()
+    # Строками "ДД.ММ.ГГГГ" 03.10 шло бы раньше 28.09, а 15.01.2025 - раньше 20.12.2024
+    for date in ("15.01.2025", "03.10.2024", "28.09.2024", "20.12.2024", "03.10.2024"):
+        index.add(date, ["Лекция"])
+    index.add("не дата", ["Лекция"])
+    start, end = storage.parse_date("01.09.2024"), storage.parse_date("31.01.2025")
+    assert index.range(start, end) == ["28.09.2024", "03.10.2024", "20.12.2024", "15.01.2025"]
+    assert index.range(storage.parse_date("30.09.2024"), storage.parse_date("20.12.2024")) == [
+        "03.10.2024", "20.12.2024"]
+
+
+def test_date_index_range_by_class_type():
+    index = storage.DateIndex()
+    index.add("01.10.2024", ["Лекция", "Лабораторная работа - 1"])
+    index.add("02.10.2024", ["Лабораторная работа - 2"])
+    index.add("08.10.2024", ["Лабораторная работа - 2", "Лекция"])
+    start, end = storage.parse_date("01.10.2024"), storage.parse_date("31.10.2024")
+    assert index.range(start, end, "Лабораторная работа - 2") == ["02.10.2024", "08.10.2024"]
+    assert index.range(start, end, "Лабораторная работа - 1") == ["01.10.2024"]
+    assert index.range(start, end, "Практика") == []
+    assert index.range(start, end) == ["01.10.2024", "02.10.2024", "08.10.2024"]